@@ -0,0 +1,287 @@
+import asyncio
+import queue
+import threading
+import time
+import numpy as np
+
+# asyncio wrapper over pyhackrf.
+#
+# The libusb callback thread only slices the stream into fixed-size blocks
+# and hands them to the event loop; conversion and DSP happen on the asyncio
+# side (or in an executor), so capture, analysis and disk I/O overlap.
+#
+#   async with AsyncHackRF(center_freq=198e6) as sdr:
+#       async for iq in sdr.rx(num_blocks=100):
+#           result = await sdr.run_dsp(analyze, iq)
+
+# === SETTINGS ===
+SAMPLE_RATE = 20e6
+CENTER_FREQ = 198e6
+LNA_GAIN = 32
+VGA_GAIN = 20
+TXVGA_GAIN = 47
+BLOCK_SIZE = 1 << 18            # IQ samples per block (~13 ms at 20 Msps)
+QUEUE_BLOCKS = 64               # Blocks buffered between callback and consumer
+
+
+def cs8_to_complex(raw):
+    # int8 interleaved I/Q -> complex64 in [-1, 1], as in record_samples.py
+    raw = np.frombuffer(raw, dtype=np.int8)
+    iq = np.empty(len(raw) // 2, dtype=np.complex64)
+    iq.real = raw[0::2]
+    iq.imag = raw[1::2]
+    iq /= 128.0
+    return iq
+
+
+def complex_to_cs8(iq):
+    iq = np.clip(np.asarray(iq, dtype=np.complex64), -1.0, 1.0)
+    iq_bytes = np.empty(2 * len(iq), dtype=np.int8)
+    iq_bytes[0::2] = np.round(iq.real * 127)
+    iq_bytes[1::2] = np.round(iq.imag * 127)
+    return iq_bytes
+
+
+class AsyncHackRF:
+
+    def __init__(self, sample_rate=SAMPLE_RATE, center_freq=CENTER_FREQ, lna_gain=LNA_GAIN,
+                 vga_gain=VGA_GAIN, txvga_gain=TXVGA_GAIN, amp_enable=False, block_size=BLOCK_SIZE,
+                 queue_blocks=QUEUE_BLOCKS, executor=None, device=None):
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.lna_gain = lna_gain
+        self.vga_gain = vga_gain
+        self.txvga_gain = txvga_gain
+        self.amp_enable = amp_enable
+        self.block_size = block_size
+        self.queue_blocks = queue_blocks
+        self.executor = executor
+        self.sdr = device
+        self._owns_device = device is None
+        self._lock = threading.Lock()       # serializes control calls to the device
+        self.loop = None
+
+        # Stream statistics
+        self.dropped = 0                    # RX blocks dropped because the consumer fell behind
+        self.last_gap = 0                   # RX blocks dropped right before the last block read
+        self.underruns = 0                  # TX callbacks that ran out of data
+        self.received = 0
+
+    # === DEVICE CONTROL ===
+
+    async def _call(self, func, *args):
+        def locked():
+            with self._lock:
+                return func(*args)
+        return await self.loop.run_in_executor(None, locked)
+
+    def _open(self):
+        if self.sdr is None:
+            from python_hackrf import pyhackrf  # type: ignore
+            self._pyhackrf = pyhackrf
+            pyhackrf.pyhackrf_init()
+            self.sdr = pyhackrf.pyhackrf_open()
+            allowed_baseband = pyhackrf.pyhackrf_compute_baseband_filter_bw_round_down_lt(self.sample_rate / 2)
+            self.sdr.pyhackrf_set_baseband_filter_bandwidth(allowed_baseband)
+        self.sdr.pyhackrf_set_sample_rate(self.sample_rate)
+        self.sdr.pyhackrf_set_freq(self.center_freq)
+        self.sdr.pyhackrf_set_amp_enable(self.amp_enable)
+        self.sdr.pyhackrf_set_lna_gain(self.lna_gain)
+        self.sdr.pyhackrf_set_vga_gain(self.vga_gain)
+
+    def _close(self):
+        self.sdr.pyhackrf_close()
+        if self._owns_device:
+            self._pyhackrf.pyhackrf_exit()
+
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        await self._call(self._open)
+        return self
+
+    async def close(self):
+        await self._call(self._close)
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def set_freq(self, freq):
+        await self._call(self.sdr.pyhackrf_set_freq, freq)
+        self.center_freq = freq
+
+    async def set_lna_gain(self, gain):
+        await self._call(self.sdr.pyhackrf_set_lna_gain, gain)
+        self.lna_gain = gain
+
+    async def set_vga_gain(self, gain):
+        await self._call(self.sdr.pyhackrf_set_vga_gain, gain)
+        self.vga_gain = gain
+
+    async def set_txvga_gain(self, gain):
+        await self._call(self.sdr.pyhackrf_set_txvga_gain, gain)
+        self.txvga_gain = gain
+
+    async def set_amp_enable(self, enable):
+        await self._call(self.sdr.pyhackrf_set_amp_enable, enable)
+        self.amp_enable = enable
+
+    async def run_dsp(self, func, *args):
+        # Offload CPU-heavy work so the event loop keeps draining the radio
+        return await self.loop.run_in_executor(self.executor, func, *args)
+
+    # === RX ===
+
+    def _start_rx(self):
+        self._rx_queue = asyncio.Queue()
+        self._rx_slots = threading.BoundedSemaphore(self.queue_blocks)
+        self._rx_pending = bytearray()
+        self._rx_gap = 0
+        block_bytes = 2 * self.block_size
+
+        def rx_callback(device, buffer, buffer_length, valid_length):
+            now = time.time()           # the buffer's last sample arrived now
+            self._rx_pending += buffer[:valid_length].tobytes()
+            while len(self._rx_pending) >= block_bytes:
+                block = bytes(self._rx_pending[:block_bytes])
+                del self._rx_pending[:block_bytes]
+                # Timestamp of the block's first sample; what is still pending
+                # came after it
+                timestamp = now - (self.block_size + len(self._rx_pending) // 2) / self.sample_rate
+                # Backpressure: never wait here, a stalled libusb thread loses
+                # transfers without counting them.  Drop (and count) instead.
+                if not self._rx_slots.acquire(blocking=False):
+                    self.dropped += 1
+                    self._rx_gap += 1
+                    continue
+                self.loop.call_soon_threadsafe(self._rx_queue.put_nowait, (timestamp, block, self._rx_gap))
+                self._rx_gap = 0
+            return 0
+
+        self.sdr.set_rx_callback(rx_callback)
+        self.sdr.pyhackrf_start_rx()
+
+    async def start_rx(self):
+        await self._call(self._start_rx)
+
+    async def stop_rx(self):
+        await self._call(self.sdr.pyhackrf_stop_rx)
+
+    async def read(self, raw=False):
+        # Next fixed-size block: complex64, or the raw cs8 bytes with raw=True
+        timestamp, block, gap = await self._rx_queue.get()
+        self._rx_slots.release()
+        self.received += 1
+        self.last_timestamp = timestamp
+        self.last_gap = gap
+        return block if raw else cs8_to_complex(block)
+
+    def flush(self):
+        # Drop blocks queued before a retune so they are not attributed to
+        # the new frequency
+        while not self._rx_queue.empty():
+            self._rx_queue.get_nowait()
+            self._rx_slots.release()
+
+    async def rx(self, num_blocks=None, raw=False):
+        await self.start_rx()
+        try:
+            count = 0
+            while num_blocks is None or count < num_blocks:
+                yield await self.read(raw)
+                count += 1
+        finally:
+            await self.stop_rx()
+
+    # === TX ===
+
+    def _start_tx(self):
+        self._tx_queue = queue.Queue()
+        self._tx_slots = asyncio.Semaphore(self.queue_blocks)
+        self._tx_current = np.zeros(0, dtype=np.int8)
+        self.sdr.pyhackrf_set_txvga_gain(self.txvga_gain)
+
+        def tx_callback(device, buffer, length, ctx):
+            filled = 0
+            while filled < length:
+                if len(self._tx_current) == 0:
+                    try:
+                        self._tx_current = self._tx_queue.get_nowait()
+                    except queue.Empty:
+                        buffer[filled:length] = 0
+                        self.underruns += 1
+                        break
+                    self.loop.call_soon_threadsafe(self._tx_slots.release)
+                take = min(length - filled, len(self._tx_current))
+                buffer[filled:filled + take] = self._tx_current[:take]
+                self._tx_current = self._tx_current[take:]
+                filled += take
+            return 0
+
+        self.sdr.set_tx_callback(tx_callback)
+        self.sdr.pyhackrf_start_tx()
+
+    async def start_tx(self):
+        await self._call(self._start_tx)
+
+    async def stop_tx(self):
+        await self._call(self.sdr.pyhackrf_stop_tx)
+
+    async def send(self, iq):
+        # Queue complex64 (or ready-made int8 cs8) samples; waits when the
+        # TX queue is full so producers run at the radio's pace
+        iq_bytes = iq if iq.dtype == np.int8 else complex_to_cs8(iq)
+        await self._tx_slots.acquire()
+        self._tx_queue.put(iq_bytes)
+
+    async def drain(self):
+        # Wait until everything queued has been handed to the radio
+        while not self._tx_queue.empty() or len(self._tx_current):
+            await asyncio.sleep(0.01)
+
+
+# === EXAMPLE: concurrent channel scan (async look.py) ===
+
+def pilot_strength(iq, sample_rate, pilot_offset, fft_bin_width=1e3):
+    t = np.arange(len(iq)) / sample_rate
+    shifted = iq * np.exp(-1j * 2 * np.pi * pilot_offset * t).astype(np.complex64)
+    N_fft = int(sample_rate / fft_bin_width)
+    psd = np.abs(np.fft.fftshift(np.fft.fft(shifted[:N_fft])))**2
+    bins_20k = int(20e3 / fft_bin_width)
+    center_bin = N_fft // 2
+    return float(np.max(psd[center_bin - bins_20k:center_bin + bins_20k + 1]))
+
+
+async def scan(settle_blocks=2):
+    from channels import dtv_channels_mhz
+    pilot_offset = -3e6 + 310e3
+    results = []
+    analyses = []
+
+    async with AsyncHackRF() as sdr:
+        await sdr.start_rx()
+        for ch_num, ch_freq_mhz in dtv_channels_mhz.items():
+            await sdr.set_freq(ch_freq_mhz * 1e6)
+            sdr.flush()
+            for _ in range(settle_blocks):
+                await sdr.read()
+            iq = await sdr.read()
+            # Analysis of this channel runs while the next one is tuned
+            analyses.append((ch_num, asyncio.ensure_future(
+                sdr.run_dsp(pilot_strength, iq, sdr.sample_rate, pilot_offset))))
+        await sdr.stop_rx()
+
+        for ch_num, task in analyses:
+            results.append((ch_num, await task))
+        print(f"{sdr.received} blocks received, {sdr.dropped} dropped")
+
+    results.sort(key=lambda x: x[1], reverse=True)
+    print("\nScan complete. Strongest pilot tone channels:")
+    for ch_num, strength in results:
+        print(f"Channel {ch_num}: Strength = {strength:.2e}")
+
+
+if __name__ == "__main__":
+    asyncio.run(scan())
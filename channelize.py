@@ -0,0 +1,167 @@
+import numpy as np
+from scipy import fft
+from argparse import ArgumentParser
+import json
+
+from channels import channels_in_band, channel_bandwidth
+
+# One-pass channelizer for cs8 captures (record_samples.py output).
+#
+# The capture is read once in overlapping blocks.  Each block costs one
+# forward FFT at the capture rate; every DTV channel inside the band then
+# takes its own slice of bins, a pass-band mask and a small inverse FFT at the
+# output rate (fast-convolution filter bank).  Output is one decimated file
+# per channel plus a JSON sidecar with the channel number and true center.
+
+# === SETTINGS ===
+CENTER_FREQ = 198e6             # Capture center frequency (Hz)
+SAMPLE_RATE = 20e6              # Capture sample rate (Hz)
+OUT_RATE = 8e6                  # Per-channel output rate (6 MHz channel + guard)
+FFT_SIZE = 40960                # Capture FFT size; FFT_SIZE * OUT_RATE / SAMPLE_RATE must be an integer
+TRANSITION = 500e3              # Mask roll-off outside the 6 MHz channel
+INPUT_FILE = "dtv_channel_iq_raw.bin"
+OUTPUT_PREFIX = "dtv_channel"
+
+
+class ChannelTap:
+
+    def __init__(self, ch_num, ch_freq, center_freq, sample_rate, out_rate, fft_size, fmt):
+        self.ch_num = ch_num
+        self.n_out = int(round(fft_size * out_rate / sample_rate))
+        if abs(self.n_out - fft_size * out_rate / sample_rate) > 1e-9 or self.n_out % 2:
+            raise ValueError("FFT_SIZE * OUT_RATE / SAMPLE_RATE must be an even integer")
+        self.bin = int(round((ch_freq - center_freq) * fft_size / sample_rate))
+        self.center_freq = center_freq + self.bin * sample_rate / fft_size
+        self.sample_rate = out_rate
+        self.fmt = fmt
+
+        # Flat over the 6 MHz channel, raised-cosine roll-off into the guard
+        half = self.n_out // 2
+        k = np.arange(-half, half)
+        freqs = np.abs(k) * sample_rate / fft_size
+        edge = channel_bandwidth / 2
+        mask = np.ones(self.n_out, dtype=np.float32)
+        ramp = (freqs > edge) & (freqs < edge + TRANSITION)
+        mask[ramp] = 0.5 + 0.5 * np.cos(np.pi * (freqs[ramp] - edge) / TRANSITION)
+        mask[freqs >= edge + TRANSITION] = 0
+        # Bins past the capture band edge (+-fs/2, Nyquist included) are zeroed
+        # rather than wrapped in from the opposite edge
+        src = k + self.bin
+        mask[(src <= -fft_size // 2) | (src >= fft_size // 2)] = 0
+        self.in_bins = np.fft.ifftshift(np.clip(src, -fft_size // 2, fft_size // 2 - 1) % fft_size)
+        self.mask = np.fft.ifftshift(mask) * (self.n_out / fft_size)
+
+        # A shift by an odd bin count flips sign every half-block hop
+        self.hop_phase = 1.0 if self.bin % 2 == 0 else -1.0
+        self.phase = 1.0
+
+    def block(self, spec):
+        n = self.n_out
+        out = fft.ifft(spec[self.in_bins] * self.mask)[n // 4: 3 * n // 4]
+        out *= self.phase
+        self.phase *= self.hop_phase
+        return out
+
+    def open(self, prefix):
+        ext = "cf32" if self.fmt == "cf32" else "cs16"
+        self.filename = f"{prefix}_ch{self.ch_num}.{ext}"
+        self.f = open(self.filename, "wb")
+        self.count = 0
+
+    def write(self, iq):
+        if self.fmt == "cf32":
+            iq.astype(np.complex64).tofile(self.f)
+        else:
+            iq_i16 = np.empty(2 * len(iq), dtype=np.int16)
+            iq_i16[0::2] = np.clip(np.round(iq.real * 32767), -32768, 32767)
+            iq_i16[1::2] = np.clip(np.round(iq.imag * 32767), -32768, 32767)
+            iq_i16.tofile(self.f)
+        self.count += len(iq)
+
+    def close(self):
+        self.f.close()
+        meta = {
+            "channel": self.ch_num,
+            "center_freq": self.center_freq,
+            "sample_rate": self.sample_rate,
+            "format": self.fmt,
+            "num_samples": self.count,
+        }
+        with open(self.filename + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+
+
+def read_cs8_blocks(filename, hop):
+    # Yields complex64 blocks of `hop` samples, int8 interleaved I/Q as
+    # written by record_samples.py, normalized to [-1, 1]
+    raw = np.memmap(filename, dtype=np.int8, mode="r")
+    for start in range(0, len(raw) // 2, hop):
+        chunk = raw[2 * start: 2 * (start + hop)]
+        iq = np.empty(len(chunk) // 2, dtype=np.complex64)
+        iq.real = chunk[0::2]
+        iq.imag = chunk[1::2]
+        iq /= 128.0
+        yield iq
+
+
+def channelize(input_file, center_freq=CENTER_FREQ, sample_rate=SAMPLE_RATE, out_rate=OUT_RATE,
+               fft_size=FFT_SIZE, output_prefix=OUTPUT_PREFIX, fmt="cf32"):
+    found = channels_in_band(center_freq, sample_rate)
+    taps = [ChannelTap(ch_num, ch_freq, center_freq, sample_rate, out_rate, fft_size, fmt)
+            for ch_num, ch_freq in found]
+    if not taps:
+        print(f"No DTV channel fits inside {center_freq/1e6:.2f} MHz +/- {sample_rate/2e6:.1f} MHz")
+        return []
+    for tap in taps:
+        tap.open(output_prefix)
+
+    # Overlap-save with 50% overlap: block m covers capture samples
+    # [m * hop - N/4, m * hop + 3N/4) and yields output for [m * hop, (m + 1) * hop)
+    hop = fft_size // 2
+    quarter = fft_size // 4
+    total = 0
+
+    def emit(prev, cur, nxt):
+        spec = fft.fft(np.concatenate([prev[-quarter:], cur, nxt[:quarter]]))
+        for tap in taps:
+            tap.write(tap.block(spec))
+
+    prev = np.zeros(hop, dtype=np.complex64)
+    cur = None
+    for iq in read_cs8_blocks(input_file, hop):
+        total += len(iq)
+        if len(iq) < hop:
+            iq = np.concatenate([iq, np.zeros(hop - len(iq), dtype=np.complex64)])
+        if cur is not None:
+            emit(prev, cur, iq)
+            prev = cur
+        cur = iq
+    if cur is not None:
+        emit(prev, cur, np.zeros(quarter, dtype=np.complex64))
+
+    for tap in taps:
+        keep = int(round(total * out_rate / sample_rate))
+        tap.f.truncate(keep * (8 if fmt == "cf32" else 4))
+        tap.f.seek(0, 2)
+        tap.count = keep
+        tap.close()
+        print(f"Channel {tap.ch_num}: {tap.center_freq/1e6:.4f} MHz, {tap.count} samples "
+              f"at {tap.sample_rate/1e6} MHz -> {tap.filename}")
+    return taps
+
+
+def main():
+    parser = ArgumentParser(description="Split a cs8 capture into one file per DTV channel in one pass")
+    parser.add_argument("input", nargs="?", default=INPUT_FILE)
+    parser.add_argument("--freq", type=float, default=CENTER_FREQ, help="capture center frequency (Hz)")
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE, help="capture sample rate (Hz)")
+    parser.add_argument("--out-rate", type=float, default=OUT_RATE, help="per-channel output rate (Hz)")
+    parser.add_argument("--fft-size", type=int, default=FFT_SIZE)
+    parser.add_argument("--prefix", default=OUTPUT_PREFIX, help="output file prefix")
+    parser.add_argument("--format", choices=["cf32", "cs16"], default="cf32")
+    args = parser.parse_args()
+    channelize(args.input, args.freq, args.rate, args.out_rate, args.fft_size, args.prefix, args.format)
+
+
+if __name__ == "__main__":
+    main()
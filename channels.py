@@ -0,0 +1,30 @@
+# Shared DTV channel table (VHF channels 2-13), used by look.py and the
+# offline tools.  Values are channel center frequencies in MHz.
+dtv_channels_mhz = {
+    2: 54 + 3,    # Channel 2 center freq = 54 MHz + 3 MHz offset to center of 6 MHz
+    3: 60 + 3,
+    4: 66 + 3,
+    5: 76 + 3,
+    6: 82 + 3,
+    7: 174 + 3,
+    8: 180 + 3,
+    9: 186 + 3,
+    10: 192 + 3,
+    11: 198 + 3,
+    12: 204 + 3,
+    13: 210 + 3,
+}
+
+channel_bandwidth = 6e6
+
+
+def channels_in_band(center_freq, sample_rate, bandwidth=channel_bandwidth):
+    # Channels whose whole 6 MHz fits inside a capture at center_freq
+    lo = center_freq - sample_rate / 2
+    hi = center_freq + sample_rate / 2
+    found = []
+    for ch_num, ch_freq_mhz in dtv_channels_mhz.items():
+        ch_freq = ch_freq_mhz * 1e6
+        if ch_freq - bandwidth / 2 >= lo and ch_freq + bandwidth / 2 <= hi:
+            found.append((ch_num, ch_freq))
+    return found
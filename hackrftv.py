@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+import sys
+import time
+from argparse import ArgumentParser
+
+_START = time.perf_counter()
+
+# Unified command line for the HackRF TV scripts:
+#
+#   python hackrftv.py record --seconds 5
+#   python hackrftv.py analyze dtv_channel_iq_raw.bin --start 42.5
+#
+# Every subcommand imports only the modules it needs, inside its handler, and
+# the HackRF is only opened once a hardware command actually runs.  --dry-run
+# stops right before the first real work (device access, file I/O), which is
+# what startup-check times against STARTUP_TARGETS_MS.
+
+# === SETTINGS ===
+# Cold start budget per subcommand (ms, process start to first useful work).
+# pilot and analyze plot with matplotlib and get a larger budget.
+STARTUP_TARGETS_MS = {
+    "record": 150,
+    "scan": 150,
+    "encode": 150,
+    "tx-audio": 150,
+    "pilot": 300,
+    "analyze": 300,
+    "spectrum": 150,
+    "tx-video": 150,
+}
+
+
+def _ready(args):
+    # Called by every handler once its imports are done
+    if args.timing:
+        print(f"[hackrftv] ready after {(time.perf_counter() - _START) * 1e3:.0f} ms", file=sys.stderr)
+    return not args.dry_run
+
+
+def cmd_record(args):
+    import record_samples
+    if not _ready(args):
+        return
+    record_samples.record(args.output, args.freq, args.rate, args.seconds, args.lna_gain, args.vga_gain,
+                          indexed=args.indexed)
+    if args.plot:
+        record_samples.plot(args.output, args.freq, args.rate)
+
+
+def cmd_scan(args):
+    import look
+    if not _ready(args):
+        return
+    look.scan(record_time=args.seconds)
+
+
+def _start_profile(args):
+    if not args.profile:
+        return None
+    import profiling
+    return profiling.enable(trace_memory=not args.no_tracemalloc)
+
+
+def _finish_profile(args, prof):
+    if prof is None:
+        return
+    print()
+    prof.report()
+    if args.profile_json:
+        prof.save_json(args.profile_json)
+        print(f"Saved stage profile to {args.profile_json}")
+    if args.profile_trace:
+        prof.save_trace(args.profile_trace)
+        print(f"Saved Chrome trace to {args.profile_trace}")
+
+
+def add_profile_args(p):
+    p.add_argument("--profile", action="store_true", help="print per-stage time and memory")
+    p.add_argument("--profile-json", help="also save the stage profile as JSON")
+    p.add_argument("--profile-trace", help="also save a Chrome trace (chrome://tracing, Perfetto)")
+    p.add_argument("--no-tracemalloc", action="store_true", help="profile without tracemalloc overhead (RSS only)")
+
+
+def cmd_pilot(args):
+    import get_pilot
+    if not _ready(args):
+        return
+    prof = _start_profile(args)
+    if args.input:
+        import test
+        iq_samples, rate = test.load_iq(args.input, args.start, args.duration, rate=args.rate)
+    else:
+        rate = args.rate or get_pilot.sample_rate
+        iq_samples = get_pilot.record(args.freq, rate, args.seconds)
+    pilot_filtered = get_pilot.extract_pilot(iq_samples, rate, pilot_wav_file=args.wav)
+    if args.plot:
+        get_pilot.plot_pilot(pilot_filtered, rate)
+    _finish_profile(args, prof)
+
+
+def cmd_encode(args):
+    import ntsc_encode
+    if not _ready(args):
+        return
+    ntsc_encode.encode(args.input, args.output, args.frames)
+
+
+def cmd_tx_audio(args):
+    import NTSC_AUDIO
+    if not _ready(args):
+        return
+    NTSC_AUDIO.transmit(NTSC_AUDIO.modulate(args.audio), args.freq, args.tx_gain)
+
+
+def cmd_tx_video(args):
+    import tx_scheduler
+    if not _ready(args):
+        return
+    scheduler = tx_scheduler.FieldScheduler()
+    if args.input.lower().endswith(".png"):
+        scheduler.start_process(tx_scheduler.png_frames, args.input, args.frames, not args.once)
+    else:
+        scheduler.start(tx_scheduler.dat_frames(args.input, loop=not args.once, chroma=lambda: scheduler.chroma))
+    scheduler.wait_ready()
+    try:
+        if args.simulate:
+            tx_scheduler.simulate(scheduler, args.simulate)
+        else:
+            tx_scheduler.transmit(scheduler, args.freq, args.rf_gain, args.if_gain, args.audio)
+    finally:
+        scheduler.stop()
+        print()
+        scheduler.report()
+        if args.report:
+            scheduler.save_report(args.report)
+
+
+def cmd_analyze(args):
+    import test
+    if not _ready(args):
+        return
+    prof = _start_profile(args)
+    test.analyze(args.input, plots=args.plot, start_time=args.start, duration=args.duration,
+                 retune_freq=args.retune_freq, rate=args.rate)
+    _finish_profile(args, prof)
+
+
+def cmd_spectrum(args):
+    import spectrum_summary
+    if not _ready(args):
+        return
+    workers = args.workers or spectrum_summary.WORKERS
+    summary = spectrum_summary.summarize(args.input, args.rate, args.freq, args.start, args.duration,
+                                         args.fft_size, rows=args.rows, cols=args.cols, workers=workers)
+    spectrum_summary.save(summary, args.output)
+    if args.plot:
+        spectrum_summary.plot(summary, args.output)
+
+
+def cmd_startup_check(args):
+    import subprocess
+    failed = False
+    print(f"{'command':<10} {'cold start':>11} {'target':>8}")
+    for command, target in STARTUP_TARGETS_MS.items():
+        argv = [sys.executable, __file__, command, "--dry-run"]
+        if command == "encode":
+            argv += ["frame.png", "out.dat"]
+        elif command == "tx-video":
+            argv += ["out.dat"]
+        best = None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            subprocess.run(argv, check=True, stdout=subprocess.DEVNULL)
+            elapsed = (time.perf_counter() - start) * 1e3
+            best = elapsed if best is None else min(best, elapsed)
+        ok = best <= target
+        failed |= not ok
+        print(f"{command:<10} {best:>8.0f} ms {target:>5} ms{'' if ok else '  OVER'}")
+    sys.exit(1 if failed else 0)
+
+
+def build_parser():
+    parser = ArgumentParser(prog="hackrftv", description="HackRF One TV capture, analysis and transmit tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, func, help):
+        p = sub.add_parser(name, help=help)
+        p.set_defaults(func=func)
+        p.add_argument("--dry-run", action="store_true", help="import everything, then stop before doing work")
+        p.add_argument("--timing", action="store_true", help="print time to first useful work")
+        return p
+
+    p = add("record", cmd_record, "record raw cs8 IQ to a file (record_samples.py)")
+    p.add_argument("--output", default="dtv_channel_iq_raw.bin")
+    p.add_argument("--freq", type=float, default=198e6)
+    p.add_argument("--rate", type=float, default=20e6)
+    p.add_argument("--seconds", type=float, default=1.0)
+    p.add_argument("--lna-gain", type=int, default=32)
+    p.add_argument("--vga-gain", type=int, default=0)
+    p.add_argument("--indexed", action="store_true", help="write an indexed recording (iq_container.py)")
+    p.add_argument("--plot", action="store_true", help="save time/frequency plots afterwards")
+
+    p = add("scan", cmd_scan, "scan DTV channels for the strongest pilot (look.py)")
+    p.add_argument("--seconds", type=float, default=2.0, help="seconds per channel")
+
+    p = add("pilot", cmd_pilot, "extract the ATSC pilot to a WAV (get_pilot.py)")
+    p.add_argument("input", nargs="?", help="use a recording instead of the HackRF")
+    p.add_argument("--freq", type=float, default=198e6)
+    p.add_argument("--rate", type=float, help="sample rate (default 20e6; an indexed recording uses its own)")
+    p.add_argument("--seconds", type=float, default=5.0)
+    p.add_argument("--start", type=float, help="seconds into the recording")
+    p.add_argument("--duration", type=float, help="seconds of the recording to use")
+    p.add_argument("--wav", default="atsc_pilot_tone.wav")
+    p.add_argument("--no-plot", dest="plot", action="store_false")
+    add_profile_args(p)
+
+    p = add("encode", cmd_encode, "encode PNG frames to NTSC baseband (ntsc_encode.py)")
+    p.add_argument("input", help="PNG file, or the first of a numbered sequence")
+    p.add_argument("output")
+    p.add_argument("--frames", type=int, default=1)
+
+    p = add("tx-audio", cmd_tx_audio, "transmit a WAV as wideband FM (NTSC_AUDIO.py)")
+    p.add_argument("audio", nargs="?", default="phantom_limb.wav")
+    p.add_argument("--freq", type=float, default=207e6)
+    p.add_argument("--tx-gain", type=int, default=47)
+
+    p = add("tx-video", cmd_tx_video, "transmit NTSC with a real-time deadline watchdog (tx_scheduler.py)")
+    p.add_argument("input", help="ntsc_encode.py .dat output, or a PNG (first of a sequence)")
+    p.add_argument("--frames", type=int, default=1)
+    p.add_argument("--once", action="store_true", help="do not loop the input")
+    p.add_argument("--freq", type=float, default=207e6)
+    p.add_argument("--rf-gain", type=int, default=47)
+    p.add_argument("--if-gain", type=int, default=40)
+    p.add_argument("--audio", help="WAV to send as the FM sound carrier")
+    p.add_argument("--simulate", type=float, help="no HackRF: consume this many seconds at the sink rate")
+    p.add_argument("--report", help="save mode times and degradation events as JSON")
+
+    p = add("analyze", cmd_analyze, "filter a recording and extract the pilot (test.py)")
+    p.add_argument("input", nargs="?", default="dtv_channel_iq_raw.bin")
+    p.add_argument("--rate", type=float, help="sample rate of a bare .bin (default 20e6)")
+    p.add_argument("--start", type=float, help="seconds into an indexed recording")
+    p.add_argument("--duration", type=float)
+    p.add_argument("--retune-freq", type=float, help="use the segment tuned to this frequency")
+    p.add_argument("--no-plot", dest="plot", action="store_false")
+    add_profile_args(p)
+
+    p = add("spectrum", cmd_spectrum, "averaged PSD, max hold and waterfall over a whole recording (spectrum_summary.py)")
+    p.add_argument("input", nargs="?", default="dtv_channel_iq_raw.bin")
+    p.add_argument("--rate", type=float, default=20e6, help="sample rate of a bare .bin")
+    p.add_argument("--freq", type=float, default=198e6, help="center frequency of a bare .bin")
+    p.add_argument("--start", type=float, default=0.0)
+    p.add_argument("--duration", type=float)
+    p.add_argument("--fft-size", type=int, default=4096)
+    p.add_argument("--rows", type=int, default=600, help="waterfall height in pixels")
+    p.add_argument("--cols", type=int, default=1024, help="waterfall width in pixels")
+    p.add_argument("--workers", type=int, help="processes (default: all cores)")
+    p.add_argument("--output", default="spectrum_summary")
+    p.add_argument("--no-plot", dest="plot", action="store_false")
+
+    p = sub.add_parser("startup-check", help="measure cold start of every subcommand against its target")
+    p.set_defaults(func=cmd_startup_check)
+    p.add_argument("--repeat", type=int, default=3)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
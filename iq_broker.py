@@ -0,0 +1,229 @@
+import asyncio
+import socket
+import struct
+import time
+from argparse import ArgumentParser
+
+from async_hackrf import AsyncHackRF, cs8_to_complex, SAMPLE_RATE, CENTER_FREQ, BLOCK_SIZE
+
+# Local IQ fan-out: one broker process owns the HackRF (or replays a file)
+# and publishes cs8 blocks over a Unix domain socket to any number of
+# subscribers (recorder, pilot monitor, spectrum view...).
+#
+# Every subscriber has its own bounded queue, i.e. its own read cursor.  A
+# subscriber that falls behind loses blocks (counted, and visible as gaps in
+# the sequence numbers) while the producer and the other subscribers carry on.
+# Blocks the HackRF layer itself dropped (AsyncHackRF.last_gap) skip sequence
+# numbers for everyone.
+
+# === SETTINGS ===
+SOCKET_PATH = "/tmp/hackrf_iq.sock"
+SUBSCRIBER_BLOCKS = 32          # Per-subscriber queue depth
+
+# Block header: magic, sequence, timestamp, center_freq, sample_rate, dropped, payload bytes
+HEADER = struct.Struct("<4sQdddII")
+MAGIC = b"IQB1"
+
+
+# === SOURCES ===
+
+async def device_source(center_freq=CENTER_FREQ, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE, **kwargs):
+    async with AsyncHackRF(sample_rate=sample_rate, center_freq=center_freq,
+                           block_size=block_size, **kwargs) as sdr:
+        async for block in sdr.rx(raw=True):
+            yield sdr.last_timestamp, sdr.center_freq, sdr.sample_rate, block, sdr.last_gap
+
+
+async def file_source(filename, center_freq=CENTER_FREQ, sample_rate=SAMPLE_RATE, block_size=BLOCK_SIZE,
+                      loop=True, realtime=True):
+    # Replays a cs8 capture (record_samples.py format) in fixed-size blocks,
+    # paced at the sample rate, so subscribers can be tested without hardware
+    block_bytes = 2 * block_size
+    block_time = block_size / sample_rate
+    start = time.time()
+    sent = 0
+    while True:
+        with open(filename, "rb") as f:
+            while True:
+                block = f.read(block_bytes)
+                if len(block) < block_bytes:
+                    break
+                if realtime:
+                    delay = start + sent * block_time - time.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                else:
+                    await asyncio.sleep(0)
+                yield start + sent * block_time, center_freq, sample_rate, block, 0
+                sent += 1
+        if not loop:
+            return
+
+
+# === BROKER ===
+
+class Subscriber:
+
+    def __init__(self, writer, depth):
+        self.writer = writer
+        self.queue = asyncio.Queue(depth)
+        self.dropped = 0
+        self.sent = 0
+
+
+class Broker:
+
+    def __init__(self, source, socket_path=SOCKET_PATH, depth=SUBSCRIBER_BLOCKS):
+        self.source = source
+        self.socket_path = socket_path
+        self.depth = depth
+        self.subscribers = set()
+        self.published = 0
+
+    async def _serve_client(self, reader, writer):
+        sub = Subscriber(writer, self.depth)
+        self.subscribers.add(sub)
+        print(f"Subscriber connected ({len(self.subscribers)} total)")
+        try:
+            while True:
+                header, block = await sub.queue.get()
+                writer.write(header)
+                writer.write(block)
+                await writer.drain()
+                sub.sent += 1
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.subscribers.discard(sub)
+            writer.close()
+            print(f"Subscriber left after {sub.sent} blocks, {sub.dropped} dropped")
+
+    def publish(self, timestamp, center_freq, sample_rate, block, gap=0):
+        # gap: blocks the source lost right before this one; skipping their
+        # sequence numbers makes the loss visible to every subscriber
+        self.published += gap
+        for sub in list(self.subscribers):
+            header = HEADER.pack(MAGIC, self.published, timestamp, center_freq, sample_rate,
+                                 sub.dropped, len(block))
+            try:
+                sub.queue.put_nowait((header, block))
+            except asyncio.QueueFull:
+                sub.dropped += 1
+        self.published += 1
+
+    async def run(self):
+        server = await asyncio.start_unix_server(self._serve_client, path=self.socket_path)
+        print(f"Publishing IQ on {self.socket_path}")
+        async with server:
+            async for timestamp, center_freq, sample_rate, block, gap in self.source:
+                self.publish(timestamp, center_freq, sample_rate, block, gap)
+
+
+# === CLIENT ===
+
+class IQSubscriber:
+    # Blocking client, so the existing scripts can consume the broker stream
+    # with a plain loop:
+    #
+    #   for header, iq in IQSubscriber():
+    #       ...
+
+    def __init__(self, socket_path=SOCKET_PATH, raw=False):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.raw = raw
+        self.expected = None
+        self.missed = 0
+
+    def _recv_exact(self, n):
+        buf = bytearray(n)
+        view = memoryview(buf)
+        got = 0
+        while got < n:
+            k = self.sock.recv_into(view[got:])
+            if k == 0:
+                raise EOFError("broker closed the connection")
+            got += k
+        return buf
+
+    def read(self):
+        magic, seq, timestamp, center_freq, sample_rate, dropped, nbytes = HEADER.unpack(
+            self._recv_exact(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("bad block header from broker")
+        if self.expected is not None and seq != self.expected:
+            self.missed += seq - self.expected
+        self.expected = seq + 1
+        block = self._recv_exact(nbytes)
+        header = {
+            "seq": seq,
+            "timestamp": timestamp,
+            "center_freq": center_freq,
+            "sample_rate": sample_rate,
+            "dropped": dropped,
+        }
+        return header, (bytes(block) if self.raw else cs8_to_complex(block))
+
+    def __iter__(self):
+        try:
+            while True:
+                yield self.read()
+        except EOFError:
+            return
+
+    def close(self):
+        self.sock.close()
+
+
+def tap(socket_path, output=None, seconds=None):
+    # Example subscriber: record to a cs8 file and/or print stream stats
+    sub = IQSubscriber(socket_path, raw=True)
+    f = open(output, "wb") if output else None
+    start = time.time()
+    nbytes = 0
+    for header, block in sub:
+        if f:
+            f.write(block)
+        nbytes += len(block)
+        if seconds is not None and time.time() - start >= seconds:
+            break
+        if header["seq"] % 100 == 0:
+            print(f"seq {header['seq']} @ {header['center_freq']/1e6:.2f} MHz, "
+                  f"{nbytes / 2 / (time.time() - start) / 1e6:.2f} Msps, missed {sub.missed}")
+    if f:
+        f.close()
+    sub.close()
+    print(f"Received {nbytes} bytes, missed {sub.missed} blocks")
+
+
+def main():
+    parser = ArgumentParser(description="Share one HackRF (or a replayed capture) with many local consumers")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="own the device and publish IQ blocks")
+    serve.add_argument("--replay", help="replay this cs8 file instead of opening the HackRF")
+    serve.add_argument("--freq", type=float, default=CENTER_FREQ)
+    serve.add_argument("--rate", type=float, default=SAMPLE_RATE)
+    serve.add_argument("--block-size", type=int, default=BLOCK_SIZE)
+    serve.add_argument("--socket", default=SOCKET_PATH)
+    tap_cmd = sub.add_parser("tap", help="subscribe and record/print stats")
+    tap_cmd.add_argument("--socket", default=SOCKET_PATH)
+    tap_cmd.add_argument("--output", help="write received cs8 to this file")
+    tap_cmd.add_argument("--seconds", type=float)
+    args = parser.parse_args()
+
+    if args.command == "tap":
+        tap(args.socket, args.output, args.seconds)
+        return
+
+    if args.replay:
+        source = file_source(args.replay, args.freq, args.rate, args.block_size)
+    else:
+        source = device_source(args.freq, args.rate, args.block_size)
+    try:
+        asyncio.run(Broker(source, args.socket).run())
+    except KeyboardInterrupt:
+        print("Stopping...")
+
+
+if __name__ == "__main__":
+    main()
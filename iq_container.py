@@ -0,0 +1,358 @@
+import numpy as np
+import datetime
+import json
+import os
+import time
+import zlib
+
+# Indexed, chunked IQ recordings.
+#
+# A recording "name" is three files:
+#   name.sigmf-data   cs8 samples in fixed-size chunks (byte-identical to the
+#                     bare .bin files when uncompressed)
+#   name.sigmf-meta   SigMF metadata; every retune/gain change starts a new
+#                     entry in "captures" at its sample offset
+#   name.sigmf-idx    one INDEX_DTYPE record per chunk: sample offset -> byte
+#                     offset, byte length and wall-clock time of its first sample
+#
+# Seeking by recording time is O(1) (sample clock), by wall-clock time a
+# binary search over the index, and only the chunks in the requested range
+# are memory-mapped (or decompressed).  Compressed recordings are only
+# readable through this module, not by generic SigMF tools.
+
+# === SETTINGS ===
+CHUNK_SAMPLES = 1 << 20         # ~52 ms at 20 Msps
+COMPRESSION = None              # None, "zlib" or "zstd" (needs the zstandard package)
+SIGMF_VERSION = "1.0.0"
+
+INDEX_DTYPE = np.dtype([
+    ("sample_start", "<u8"),
+    ("byte_start", "<u8"),
+    ("byte_length", "<u4"),
+    ("num_samples", "<u4"),
+    ("timestamp", "<f8"),
+])
+
+
+def _compressor(name):
+    if name is None:
+        return None, None
+    if name == "zlib":
+        return (lambda b: zlib.compress(b, 1)), zlib.decompress
+    if name == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("zstd compression needs the 'zstandard' package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=1).compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError("unknown compression %r" % name)
+
+
+def _iso(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+class RecordingWriter:
+
+    def __init__(self, name, sample_rate, center_freq, lna_gain=None, vga_gain=None,
+                 chunk_samples=CHUNK_SAMPLES, compression=COMPRESSION, description=""):
+        self.name = name
+        self.sample_rate = sample_rate
+        self.chunk_samples = chunk_samples
+        self.compression = compression
+        self.compress, _ = _compressor(compression)
+        self.data = open(name + ".sigmf-data", "wb")
+        self.index = open(name + ".sigmf-idx", "wb")
+
+        self.meta = {
+            "global": {
+                "core:datatype": "ci8",
+                "core:sample_rate": sample_rate,
+                "core:version": SIGMF_VERSION,
+                "core:hw": "HackRF One",
+                "core:description": description,
+                "hackrf:chunk_samples": chunk_samples,
+                "hackrf:compression": compression,
+            },
+            "captures": [],
+            "annotations": [],
+        }
+        self.center_freq = center_freq
+        self.gains = {"lna_gain": lna_gain, "vga_gain": vga_gain}
+
+        self.pending = bytearray()
+        self.pending_time = None        # wall-clock time of pending[0]
+        self.samples = 0                # samples handed to write()
+        self.written_samples = 0        # samples already in chunks
+        self.byte_offset = 0
+        self._add_capture(time.time())
+
+    def _add_capture(self, timestamp):
+        capture = {
+            "core:sample_start": self.samples,
+            "core:frequency": self.center_freq,
+            "core:datetime": _iso(timestamp),
+        }
+        capture.update({"hackrf:" + k: v for k, v in self.gains.items() if v is not None})
+        captures = self.meta["captures"]
+        if captures and captures[-1]["core:sample_start"] == self.samples:
+            captures[-1] = capture
+        else:
+            captures.append(capture)
+        self._write_meta()
+
+    def _write_meta(self):
+        tmp = self.name + ".sigmf-meta.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp, self.name + ".sigmf-meta")
+
+    def _flush_chunk(self, nbytes):
+        chunk = bytes(self.pending[:nbytes])
+        del self.pending[:nbytes]
+        n = nbytes // 2
+        payload = self.compress(chunk) if self.compress else chunk
+        self.data.write(payload)
+        record = np.array([(self.written_samples, self.byte_offset, len(payload), n, self.pending_time)],
+                          dtype=INDEX_DTYPE)
+        self.index.write(record.tobytes())
+        self.written_samples += n
+        self.byte_offset += len(payload)
+        self.pending_time += n / self.sample_rate
+
+    def write(self, block, timestamp=None):
+        # block: cs8 bytes; timestamp: wall-clock time of its first sample
+        if timestamp is None:
+            timestamp = time.time() - len(block) / 2 / self.sample_rate
+        if self.samples == 0:
+            self.meta["captures"][0]["core:datetime"] = _iso(timestamp)
+        if self.pending_time is None or not self.pending:
+            self.pending_time = timestamp
+        self.pending += bytes(block)
+        self.samples += len(block) // 2
+        chunk_bytes = 2 * self.chunk_samples
+        while len(self.pending) >= chunk_bytes:
+            self._flush_chunk(chunk_bytes)
+
+    def _next_sample_time(self):
+        # Wall-clock time of the next sample on the recording's own timeline
+        # (the one the chunk timestamps follow)
+        if self.pending_time is None:
+            return time.time()
+        return self.pending_time + len(self.pending) / 2 / self.sample_rate
+
+    def retune(self, center_freq, timestamp=None):
+        # Takes effect at the next sample written
+        self.center_freq = center_freq
+        self._add_capture(self._next_sample_time() if timestamp is None else timestamp)
+
+    def set_gain(self, timestamp=None, **gains):
+        self.gains.update(gains)
+        self._add_capture(self._next_sample_time() if timestamp is None else timestamp)
+
+    def annotate(self, sample_start, sample_count, label, **fields):
+        annotation = {"core:sample_start": sample_start, "core:sample_count": sample_count, "core:label": label}
+        annotation.update(fields)
+        self.meta["annotations"].append(annotation)
+
+    def close(self):
+        if self.pending:
+            self._flush_chunk(len(self.pending) - len(self.pending) % 2)
+        self.data.close()
+        self.index.close()
+        self._write_meta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Recording:
+
+    def __init__(self, name):
+        if name.endswith((".sigmf-meta", ".sigmf-data", ".sigmf-idx")):
+            name = name.rsplit(".", 1)[0]
+        self.name = name
+        with open(name + ".sigmf-meta") as f:
+            self.meta = json.load(f)
+        g = self.meta["global"]
+        self.sample_rate = g["core:sample_rate"]
+        self.chunk_samples = g.get("hackrf:chunk_samples", CHUNK_SAMPLES)
+        self.compression = g.get("hackrf:compression")
+        _, self.decompress = _compressor(self.compression)
+        self.data_file = os.path.join(os.path.dirname(name), g["core:dataset"]) if "core:dataset" in g \
+            else name + ".sigmf-data"
+        self.index = np.fromfile(name + ".sigmf-idx", dtype=INDEX_DTYPE)
+        self.captures = self.meta["captures"]
+        self.num_samples = int(self.index["sample_start"][-1] + self.index["num_samples"][-1]) \
+            if len(self.index) else 0
+        self.duration = self.num_samples / self.sample_rate
+        self.start_time = float(self.index["timestamp"][0]) if len(self.index) else None
+
+    # === SEEKING ===
+
+    def sample_at(self, seconds):
+        # Recording time (s from the first sample) -> sample offset, O(1)
+        return min(max(int(round(seconds * self.sample_rate)), 0), self.num_samples)
+
+    def sample_at_time(self, timestamp):
+        # Wall-clock time -> sample offset, via the per-chunk timestamps
+        k = max(int(np.searchsorted(self.index["timestamp"], timestamp, side="right")) - 1, 0)
+        rec = self.index[k]
+        offset = int(rec["sample_start"]) + int(round((timestamp - rec["timestamp"]) * self.sample_rate))
+        return min(max(offset, 0), self.num_samples)
+
+    def time_at(self, sample):
+        # Sample offset -> wall-clock time
+        k = max(int(np.searchsorted(self.index["sample_start"], sample, side="right")) - 1, 0)
+        rec = self.index[k]
+        return float(rec["timestamp"]) + (sample - int(rec["sample_start"])) / self.sample_rate
+
+    def segments(self):
+        # (start, end, capture) for every capture segment (between retunes/gain changes)
+        out = []
+        for i, capture in enumerate(self.captures):
+            start = capture["core:sample_start"]
+            end = self.captures[i + 1]["core:sample_start"] if i + 1 < len(self.captures) else self.num_samples
+            out.append((start, end, capture))
+        return out
+
+    def segment_at_freq(self, frequency, after=0, tolerance=1.0):
+        # First segment tuned to `frequency` that starts at or after sample `after`
+        for start, end, capture in self.segments():
+            if start >= after and abs(capture["core:frequency"] - frequency) <= tolerance:
+                return start, end, capture
+        raise KeyError("no segment at %.3f MHz" % (frequency / 1e6))
+
+    def capture_at(self, sample):
+        for start, end, capture in self.segments():
+            if start <= sample < end:
+                return capture
+        return self.captures[-1]
+
+    # === READING ===
+
+    def read_raw(self, start=0, count=None):
+        # cs8 samples [start, start + count) as an int8 array; uncompressed data
+        # is memory-mapped, so only the touched pages are read
+        if count is None:
+            count = self.num_samples - start
+        count = max(min(count, self.num_samples - start), 0)
+        if count == 0:
+            return np.zeros(0, dtype=np.int8)
+        if self.decompress is None:
+            # Uncompressed chunks are contiguous: byte offset = 2 * sample offset
+            return np.memmap(self.data_file, dtype=np.int8, mode="r", offset=2 * start, shape=(2 * count,))
+
+        first = int(np.searchsorted(self.index["sample_start"], start, side="right")) - 1
+        out = np.empty(2 * count, dtype=np.int8)
+        filled = 0
+        with open(self.data_file, "rb") as f:
+            k = first
+            while filled < count:
+                rec = self.index[k]
+                f.seek(int(rec["byte_start"]))
+                chunk = np.frombuffer(self.decompress(f.read(int(rec["byte_length"]))), dtype=np.int8)
+                skip = max(start + filled - int(rec["sample_start"]), 0)
+                take = min(int(rec["num_samples"]) - skip, count - filled)
+                out[2 * filled:2 * (filled + take)] = chunk[2 * skip:2 * (skip + take)]
+                filled += take
+                k += 1
+        return out
+
+    def read(self, start=0, count=None):
+        # complex64 in [-1, 1], same scaling as record_samples.py
+        raw = self.read_raw(start, count)
+        iq = np.empty(len(raw) // 2, dtype=np.complex64)
+        iq.real = raw[0::2]
+        iq.imag = raw[1::2]
+        iq /= 128.0
+        return iq
+
+    def read_seconds(self, start_s, duration_s=None):
+        start = self.sample_at(start_s)
+        count = None if duration_s is None else int(round(duration_s * self.sample_rate))
+        return self.read(start, count)
+
+
+def import_raw(bin_file, sample_rate, center_freq, timestamp=None, chunk_samples=CHUNK_SAMPLES, **gains):
+    # Index an existing bare cs8 .bin in place: meta + index next to it, the
+    # .bin itself is referenced as a non-conforming SigMF dataset.
+    name = os.path.splitext(bin_file)[0]
+    num_samples = os.path.getsize(bin_file) // 2
+    if timestamp is None:
+        timestamp = os.path.getmtime(bin_file) - num_samples / sample_rate
+    starts = np.arange(0, num_samples, chunk_samples, dtype=np.uint64)
+    index = np.zeros(len(starts), dtype=INDEX_DTYPE)
+    index["sample_start"] = starts
+    index["byte_start"] = 2 * starts
+    index["num_samples"] = np.minimum(chunk_samples, num_samples - starts)
+    index["byte_length"] = 2 * index["num_samples"]
+    index["timestamp"] = timestamp + starts / sample_rate
+    index.tofile(name + ".sigmf-idx")
+
+    capture = {"core:sample_start": 0, "core:frequency": center_freq, "core:datetime": _iso(timestamp)}
+    capture.update({"hackrf:" + k: v for k, v in gains.items()})
+    meta = {
+        "global": {
+            "core:datatype": "ci8",
+            "core:sample_rate": sample_rate,
+            "core:version": SIGMF_VERSION,
+            "core:hw": "HackRF One",
+            "core:dataset": os.path.basename(bin_file),
+            "hackrf:chunk_samples": chunk_samples,
+            "hackrf:compression": None,
+        },
+        "captures": [capture],
+        "annotations": [],
+    }
+    with open(name + ".sigmf-meta", "w") as f:
+        json.dump(meta, f, indent=2)
+    return Recording(name)
+
+
+def main():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(description="Inspect, import or compress indexed IQ recordings")
+    sub = parser.add_subparsers(dest="command", required=True)
+    info = sub.add_parser("info", help="print metadata, segments and index summary")
+    info.add_argument("name")
+    imp = sub.add_parser("import", help="index an existing bare cs8 .bin in place")
+    imp.add_argument("bin_file")
+    imp.add_argument("--rate", type=float, default=20e6)
+    imp.add_argument("--freq", type=float, default=198e6)
+    pack = sub.add_parser("pack", help="rewrite a recording with per-chunk compression for cold storage")
+    pack.add_argument("name")
+    pack.add_argument("output")
+    pack.add_argument("--compression", choices=["zlib", "zstd"], default="zlib")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        rec = import_raw(args.bin_file, args.rate, args.freq)
+        print(f"Indexed {rec.num_samples} samples ({rec.duration:.2f} s) in {len(rec.index)} chunks")
+    elif args.command == "info":
+        rec = Recording(args.name)
+        print(f"{rec.name}: {rec.num_samples} samples, {rec.duration:.3f} s at {rec.sample_rate/1e6} MHz, "
+              f"{len(rec.index)} chunks, compression {rec.compression}")
+        for start, end, capture in rec.segments():
+            print(f"  [{start / rec.sample_rate:9.3f} s - {end / rec.sample_rate:9.3f} s] "
+                  f"{capture['core:frequency']/1e6:.3f} MHz  {capture['core:datetime']}")
+    elif args.command == "pack":
+        rec = Recording(args.name)
+        first = rec.captures[0]
+        with RecordingWriter(args.output, rec.sample_rate, first["core:frequency"],
+                             chunk_samples=rec.chunk_samples, compression=args.compression) as out:
+            out.meta["captures"] = []
+            for start, end, capture in rec.segments():
+                out.meta["captures"].append(dict(capture))
+                for k in range(start, end, rec.chunk_samples):
+                    n = min(rec.chunk_samples, end - k)
+                    out.write(rec.read_raw(k, n).tobytes(), rec.time_at(k))
+        packed = os.path.getsize(args.output + ".sigmf-data")
+        print(f"Packed {rec.num_samples * 2 / 1e6:.1f} MB -> {packed / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,608 @@
+import numpy as np
+import json
+import os
+import tempfile
+import time
+import zlib
+from argparse import ArgumentParser
+
+# Offline loopback regression harness: encode -> modulate -> impair ->
+# channel filter -> demodulate, over a batch of synthetic cases.
+#
+#   video  test pattern -> ntsc_encode.genFields -> VSB modulator (the
+#          multi_tx.vsb_filter of the transmitters)
+#          -> impairments -> receiver IF filter (independent of the TX
+#          filter), synchronous detector, luma filter -> PSNR of the recovered
+#          luma against the source image, and colour burst amplitude
+#   audio  test tone WAV -> NTSC_AUDIO.modulate (cs8) -> impairments -> FM
+#          channel filter and discriminator -> SNR of the tone
+#   pilot  ATSC-like channel (noise-like data + pilot) -> impairments ->
+#          pilot_tracker.PilotTracker -> error of the measured pilot offset
+#   synth  NTSC program (test pattern) and ATSC-like program on adjacent DTV
+#          channels -> multi_tx.WidebandSynth -> impairments (cs8 file) ->
+#          channelize.channelize -> video demod and PilotTracker per channel
+#          -> luma PSNR, burst and pilot offset error as above
+#
+# Impairments are added noise (SNR over the occupied signal), a carrier
+# frequency offset and quantization to cs8 (async_hackrf conversions).
+# Noise is seeded from the case name, so repeated runs are comparable.
+# Every stage is timed with profiling.py to give throughput per case.
+#
+# Cases run in parallel.  Results go to RESULTS_FILE and are compared with
+# BASELINE_FILE (a previous run saved with --update-baseline); quality
+# regressions beyond the tolerances below make the run exit non-zero.
+
+# === SETTINGS ===
+VIDEO_PATTERNS = ("bars", "ramp")
+VIDEO_SNR_DB = (40, 25)
+VIDEO_OFFSETS_HZ = (0, 25e3)
+AUDIO_TONES_HZ = (400, 1000, 5000)
+AUDIO_SNR_DB = (30, 15)
+AUDIO_OFFSETS_HZ = (0, 5e3)
+PILOT_OFFSETS_HZ = (0, 500, -1200)
+PILOT_SNR_DB = (15, 5)
+PILOT_SECONDS = 1.5
+AUDIO_SECONDS = 1.0
+PEAK = 0.9                      # TX level before quantization (multi_tx.py HEADROOM)
+PILOT_CREST = 5.0               # Fixed peak/rms scale for the block-wise pilot cases
+SYNTH_PATTERNS = ("bars",)
+SYNTH_SNR_DB = (35,)            # Over the whole 20 MHz synthesizer output
+SYNTH_OFFSETS_HZ = (0, 500)
+SYNTH_CENTER = 204e6            # Channels 11 (NTSC program) and 12 (ATSC-like program)
+SYNTH_ATSC_RATE = 10e6          # 20000 of the synthesizer's 40000 bins, exact
+SYNTH_ATSC_GAIN = 0.5
+SYNTH_VIDEO_START = 0.2         # Seconds into the channelizer output where the frame is taken
+
+PSNR_TOL_DB = 0.5               # Allowed drop before a case counts as a regression
+SNR_TOL_DB = 1.0
+PILOT_TOL_HZ = 1.0
+BURST_TOL_IRE = 2.0
+THROUGHPUT_TOL = 0.25           # Slowdown reported (not failed) beyond this fraction
+
+WORKERS = os.cpu_count() or 1
+RESULTS_FILE = "loopback_results.json"
+BASELINE_FILE = "loopback_baseline.json"
+COMPARE_FILE = "loopback_compare.json"
+
+# Sample offsets into a genFields frame (ntsc_encode.py layout): first
+# visible line of each field, and the first pixel after sync + back porch
+LINE = 772
+EVEN_FIRST_LINE = 18 * 386 + 13 * LINE
+ODD_FIRST_LINE = 202650 + 18 * 386 + 386 + 12 * LINE + LINE
+PIXEL_START = 57 + 13 + 31 + 13
+BURST_START = 57 + 13
+BURST_SAMPLES = 31
+EDGE_PIXELS = 8                 # Ignored at each end of a line (filter ramp-up)
+
+# Metric name -> (better direction, regression tolerance)
+METRICS = {
+    "psnr_db": (1, PSNR_TOL_DB),
+    "audio_snr_db": (1, SNR_TOL_DB),
+    "pilot_error_hz": (-1, PILOT_TOL_HZ),
+    "burst_ire": (1, BURST_TOL_IRE),
+}
+
+# Absolute limits, checked with or without a baseline.  The encoder's burst
+# is 20 IRE; below this the receiver has lost chroma.
+FLOORS = {
+    "burst_ire": 10.0,
+}
+
+
+def default_cases():
+    cases = []
+    for pattern in VIDEO_PATTERNS:
+        for snr in VIDEO_SNR_DB:
+            for offset in VIDEO_OFFSETS_HZ:
+                cases.append({"name": f"video-{pattern}-snr{snr}-off{offset:g}", "kind": "video",
+                              "pattern": pattern, "snr_db": snr, "offset_hz": offset})
+    for tone in AUDIO_TONES_HZ:
+        for snr in AUDIO_SNR_DB:
+            for offset in AUDIO_OFFSETS_HZ:
+                cases.append({"name": f"audio-{tone}hz-snr{snr}-off{offset:g}", "kind": "audio",
+                              "tone_hz": tone, "snr_db": snr, "offset_hz": offset})
+    for offset in PILOT_OFFSETS_HZ:
+        for snr in PILOT_SNR_DB:
+            cases.append({"name": f"pilot-snr{snr}-off{offset:g}", "kind": "pilot",
+                          "snr_db": snr, "offset_hz": offset})
+    for pattern in SYNTH_PATTERNS:
+        for snr in SYNTH_SNR_DB:
+            for offset in SYNTH_OFFSETS_HZ:
+                cases.append({"name": f"synth-{pattern}-snr{snr}-off{offset:g}", "kind": "synth",
+                              "pattern": pattern, "snr_db": snr, "offset_hz": offset})
+    return cases
+
+
+# === IMPAIRMENTS ===
+
+def impair(iq, rate, snr_db, offset_hz, rng, signal_power=None, scale=None):
+    # Scale to PEAK, add complex noise at snr_db, shift by offset_hz and
+    # quantize to cs8 and back, as a HackRF TX -> RX loop would.
+    # signal_power is the power of the unscaled iq (measured if None); a
+    # fixed scale keeps the gain constant when a signal is fed in blocks.
+    from async_hackrf import complex_to_cs8, cs8_to_complex
+
+    fixed = scale is not None
+    if not fixed:
+        scale = PEAK / np.max(np.abs(iq))
+    if signal_power is None:
+        signal_power = np.mean(np.abs(iq) ** 2)
+    iq = iq * scale
+    signal_power = signal_power * scale ** 2
+    noise_rms = np.sqrt(signal_power / 10 ** (snr_db / 10) / 2)
+    noisy = iq + noise_rms * (rng.standard_normal(len(iq)) + 1j * rng.standard_normal(len(iq)))
+    if offset_hz:
+        noisy *= np.exp(2j * np.pi * offset_hz * np.arange(len(iq)) / rate)
+    if not fixed:
+        # Back off so noise peaks do not clip in the int8 converter
+        noisy *= PEAK / max(np.max(np.abs(noisy.real)), np.max(np.abs(noisy.imag)), PEAK)
+    return cs8_to_complex(complex_to_cs8(noisy.astype(np.complex64)).tobytes())
+
+
+# === VIDEO ===
+
+def test_pattern(name, width=640, height=480):
+    # RGB uint8 image (height, width, 3)
+    if name == "bars":
+        colours = [(191, 191, 191), (191, 191, 0), (0, 191, 191), (0, 191, 0),
+                   (191, 0, 191), (191, 0, 0), (0, 0, 191)]
+        column = np.arange(width) * len(colours) // width
+        row = np.array(colours, dtype=np.uint8)[column]
+        return np.repeat(row[None, :, :], height, axis=0)
+    if name == "ramp":
+        level = np.linspace(0, 255, width).astype(np.uint8)
+        img = np.repeat(level[None, :, None], 3, axis=2)
+        img = np.repeat(img, height, axis=0)
+        img[height // 2:, :, 1] = 255 - img[height // 2:, :, 1]   # some chroma in the lower half
+        return img
+    raise ValueError(f"unknown pattern {name}")
+
+
+def vsb_modulate(composite, rate):
+    # Composite at ntsc_encode.py levels -> vestigial sideband visual carrier
+    # at 0 Hz (multi_tx applies the same taps inside the synthesizer's FFT)
+    from scipy.signal import fftconvolve
+    from multi_tx import vsb_filter, VIDEO_GAIN
+    composite = np.asarray(composite, dtype=np.float32) * VIDEO_GAIN
+    return fftconvolve(composite.astype(np.complex64), vsb_filter(rate), mode="same").astype(np.complex64)
+
+
+def frame_luma(composite_ire):
+    # Visible pixels of a genFields frame -> (480, 640) luma in [0, 1]
+    from ntsc_encode import BLACK_LEVEL, WHITE_LEVEL
+    rows = np.empty((480, 640), dtype=np.float32)
+    for line in range(480):
+        start = (EVEN_FIRST_LINE if line % 2 == 0 else ODD_FIRST_LINE) + (line // 2) * LINE + PIXEL_START
+        rows[line] = composite_ire[start:start + 640]
+    return (rows - BLACK_LEVEL) / (WHITE_LEVEL - BLACK_LEVEL)
+
+
+def ntsc_if_filter(rate, num_taps=511):
+    # Receiver IF response, designed independently of the TX VSB filter:
+    # Nyquist slope through the visual carrier (0 at -0.75 MHz, half at the
+    # carrier, 1 at +0.75 MHz), flat to 4.2 MHz, aural carrier rejected.
+    # Frequency sampling on a fine grid, then windowed to num_taps.
+    grid = 8192
+    f = np.fft.fftfreq(grid, 1 / rate)
+    h = np.clip((f + 0.75e6) / 1.5e6, 0, 1)
+    top = (f > 4.2e6) & (f < 4.4e6)
+    h[top] = 0.5 + 0.5 * np.cos(np.pi * (f[top] - 4.2e6) / 0.2e6)
+    h[f >= 4.4e6] = 0
+    taps = np.fft.fftshift(np.fft.ifft(h))[grid // 2 - num_taps // 2:grid // 2 + num_taps // 2 + 1]
+    return (taps * np.kaiser(num_taps, 8)).astype(np.complex64)
+
+
+def line_starts():
+    lines = np.arange(480)
+    return lines // 2 * LINE + np.where(lines % 2 == 0, EVEN_FIRST_LINE, ODD_FIRST_LINE)
+
+
+def video_demod(iq, rate):
+    # Receiver IF filter, synchronous detector and sync tip / blanking
+    # calibration to IRE; returns the composite in IRE and its luma (low
+    # pass that removes the 3.58 MHz chroma subcarrier).  The carrier is
+    # recovered from the sync tips, where the visual carrier is unmodulated:
+    # a coarse frequency from the phase slope inside each tip, then the
+    # phase of every tip interpolated across the frame.
+    from scipy.signal import fftconvolve, firwin
+
+    x = fftconvolve(iq, ntsc_if_filter(rate), mode="same")
+    order = np.argsort(line_starts())
+    starts = line_starts()[order]
+    tips = x[starts[:, None] + np.arange(10, 50)]
+    step = np.angle(np.sum(tips[:, 1:] * np.conj(tips[:, :-1])))
+    x = x * np.exp(-1j * step * np.arange(len(x)))
+    tip_phase = np.unwrap(np.angle(np.sum(x[starts[:, None] + np.arange(10, 50)], axis=1)))
+    phase = np.interp(np.arange(len(x)), starts + 30, tip_phase)
+    detected = np.real(x * np.exp(-1j * phase))
+
+    sync = np.median(detected[starts[:, None] + np.arange(10, 50)])
+    blank = np.median(detected[starts[:, None] + np.arange(60, 68)])
+    ire = -40.0 * (detected - blank) / (sync - blank)
+    luma_taps = firwin(101, 2.8e6, fs=rate)
+    return ire, fftconvolve(ire, luma_taps, mode="same")
+
+
+def burst_amplitude(ire, rate):
+    # Colour burst amplitude (IRE, 20 when intact), median over the visible lines
+    from ntsc_encode import COLOR_FREQ
+    n = line_starts()[:, None] + BURST_START + np.arange(BURST_SAMPLES)
+    carrier = np.exp(-2j * np.pi * COLOR_FREQ * n / rate)
+    return float(np.median(2 * np.abs(np.mean(ire[n] * carrier, axis=1))))
+
+
+def encode_pattern(name):
+    from ntsc_encode import genFields
+    from profiling import stage
+
+    img = test_pattern(name)
+    with stage("encode", img.shape[0] * img.shape[1]):
+        composite = np.array(genFields([tuple(p) for p in img.reshape(-1, 3).tolist()]), dtype=np.float32)
+    return img, composite
+
+
+def score_video(rx, img):
+    # Frame-aligned visual carrier at SAMP_RATE -> luma PSNR and burst
+    from ntsc_encode import SAMP_RATE
+    from profiling import stage
+
+    reference = (0.30 * img[..., 0] + 0.59 * img[..., 1] + 0.11 * img[..., 2]) / 255
+    with stage("demod", len(rx)):
+        ire, luma_ire = video_demod(rx, SAMP_RATE)
+        luma = frame_luma(luma_ire)
+    keep = slice(EDGE_PIXELS, 640 - EDGE_PIXELS)
+    mse = np.mean((luma[:, keep] - reference[:, keep]) ** 2)
+    return {"psnr_db": float(10 * np.log10(1.0 / mse)), "burst_ire": burst_amplitude(ire, SAMP_RATE)}
+
+
+def run_video(case, rng):
+    from ntsc_encode import SAMP_RATE
+    from profiling import stage
+
+    img, composite = encode_pattern(case["pattern"])
+    with stage("modulate", len(composite)):
+        iq = vsb_modulate(composite, SAMP_RATE)
+    with stage("impair", len(iq)):
+        rx = impair(iq, SAMP_RATE, case["snr_db"], case["offset_hz"], rng)
+    return score_video(rx, img)
+
+
+# === AUDIO ===
+
+def fm_demod(iq, rate, quad_rate, deviation, audio_rate):
+    # FM channel filter + decimation to the quadrature rate, discriminator,
+    # DC removal (carrier offset), decimation to audio
+    from scipy.signal import resample_poly
+    base = resample_poly(iq, 1, int(rate // quad_rate))
+    audio = np.angle(base[1:] * np.conj(base[:-1])) / (2 * np.pi * deviation / quad_rate)
+    audio -= np.mean(audio)
+    return resample_poly(audio, 1, int(quad_rate // audio_rate))
+
+
+def tone_snr(audio, rate, tone_hz, trim=0.05):
+    # Least-squares fit of the tone (plus DC); everything else is noise
+    n = int(trim * rate)
+    x = audio[n:len(audio) - n]
+    t = np.arange(len(x)) / rate
+    basis = np.stack([np.cos(2 * np.pi * tone_hz * t), np.sin(2 * np.pi * tone_hz * t), np.ones_like(t)], axis=1)
+    coef, *_ = np.linalg.lstsq(basis, x, rcond=None)
+    fit = basis[:, :2] @ coef[:2]
+    residual = x - basis @ coef
+    return 10 * np.log10(np.mean(fit ** 2) / np.mean(residual ** 2))
+
+
+def run_audio(case, rng, tmpdir):
+    from scipy.io import wavfile
+    import NTSC_AUDIO
+    from async_hackrf import cs8_to_complex
+    from profiling import stage
+
+    audio_rate = 48000
+    t = np.arange(int(AUDIO_SECONDS * audio_rate)) / audio_rate
+    wav_file = os.path.join(tmpdir, case["name"] + ".wav")
+    wavfile.write(wav_file, audio_rate, np.int16(0.8 * 32767 * np.sin(2 * np.pi * case["tone_hz"] * t)))
+
+    with stage("modulate", len(t)):
+        iq = cs8_to_complex(NTSC_AUDIO.modulate(wav_file).tobytes())
+    with stage("impair", len(iq)):
+        rx = impair(iq, NTSC_AUDIO.TX_RATE, case["snr_db"], case["offset_hz"], rng)
+    with stage("demod", len(rx)):
+        audio = fm_demod(rx, NTSC_AUDIO.TX_RATE, NTSC_AUDIO.QUAD_RATE, NTSC_AUDIO.FREQ_DEV, audio_rate)
+    return {"audio_snr_db": float(tone_snr(audio, audio_rate, case["tone_hz"]))}
+
+
+# === PILOT ===
+
+PILOT_AMPL = np.sqrt(10 ** (-11.3 / 10))    # ATSC pilot is 11.3 dB below the data power
+
+
+class AtscSource:
+    # ATSC-like channel: data modelled as white noise over the whole rate,
+    # plus the pilot at pilot_freq; read(n) like the multi_tx sources
+
+    def __init__(self, rate, pilot_freq, rng):
+        self.rate = rate
+        self.pilot_freq = pilot_freq
+        self.rng = rng
+        self.index = 0
+
+    def read(self, n):
+        data = (self.rng.standard_normal(n) + 1j * self.rng.standard_normal(n)) / np.sqrt(2)
+        pilot = PILOT_AMPL * np.exp(2j * np.pi * self.pilot_freq * (self.index + np.arange(n)) / self.rate)
+        self.index += n
+        return (data + pilot).astype(np.complex64)
+
+
+def pilot_metrics(estimates, offset_hz):
+    locked = [e for e in estimates if e["locked"]] or estimates
+    if not locked:
+        return {"pilot_error_hz": float("nan"), "pilot_locked": False}
+    last = locked[-1]
+    return {"pilot_error_hz": float(abs(last["freq_error_hz"] - offset_hz)),
+            "pilot_snr_db": float(last["pilot_snr_db"]), "pilot_locked": bool(last["locked"])}
+
+
+def run_pilot(case, rng, block=1 << 20):
+    import pilot_tracker
+    from profiling import stage
+
+    rate = pilot_tracker.SAMPLE_RATE
+    source = AtscSource(rate, pilot_tracker.PILOT_OFFSET + case["offset_hz"], rng)
+    tracker = pilot_tracker.PilotTracker(estimate_file=None)
+    signal_power = 1.0 + PILOT_AMPL ** 2
+    # Same gain for every block: channel plus noise rms at PEAK / PILOT_CREST
+    scale = PEAK / PILOT_CREST / np.sqrt(signal_power * (1 + 10 ** (-case["snr_db"] / 10)))
+    estimates = []
+    total = int(PILOT_SECONDS * rate)
+    for start in range(0, total, block):
+        n = min(block, total - start)
+        with stage("modulate", n):
+            iq = source.read(n)
+        with stage("impair", n):
+            # Offset is already in the synthesized pilot; noise on top of the channel
+            rx = impair(iq, rate, case["snr_db"], 0.0, rng, signal_power=signal_power, scale=scale)
+        with stage("demod", n):
+            estimates += tracker.process(rx)
+    return pilot_metrics(estimates, case["offset_hz"])
+
+
+# === SYNTHESIZER + CHANNELIZER ===
+
+def align_frame(x, composite, rate, start):
+    # x carries composite looped at rate; return the contiguous frame of x
+    # at or after start that begins where composite does, located by the
+    # circular correlation of the envelopes (sync tips dominate)
+    frame = len(composite)
+    ref = np.fft.fft(np.abs(vsb_modulate(composite, rate)))
+    corr = np.fft.ifft(np.fft.fft(np.abs(x[start:start + frame])) * np.conj(ref)).real
+    start += int(np.argmax(corr))
+    return x[start:start + frame]
+
+
+def run_synth(case, rng, tmpdir):
+    import channelize
+    import multi_tx
+    import pilot_tracker
+    from async_hackrf import complex_to_cs8
+    from channels import channels_in_band
+    from ntsc_encode import SAMP_RATE
+    from profiling import stage
+    from scipy.signal import resample_poly
+
+    img, composite = encode_pattern(case["pattern"])
+    dat_file = os.path.join(tmpdir, "program.dat")
+    composite.tofile(dat_file)
+    video_ch, atsc_ch = channels_in_band(SYNTH_CENTER, multi_tx.OUT_RATE)[:2]
+    visual = video_ch[1] - 1.75e6                   # 1.25 MHz above the lower channel edge
+
+    rate = multi_tx.OUT_RATE
+    synth = multi_tx.WidebandSynth()
+    multi_tx.add_ntsc(synth, dat_file, offset=visual - SYNTH_CENTER)
+    synth.add_channel(AtscSource(SYNTH_ATSC_RATE, pilot_tracker.PILOT_OFFSET, rng), SYNTH_ATSC_RATE,
+                      atsc_ch[1] - SYNTH_CENTER, SYNTH_ATSC_GAIN, (-3.2e6, 3.2e6))
+
+    # Same impairments as impair(), streamed to a cs8 file: the synthesizer
+    # holds its own peak level, so the noise is set from the first hops
+    # after the start-up ramp and the offset runs on one sample clock
+    cs8_file = os.path.join(tmpdir, "synth.cs8")
+    hop = synth.fft_size // 2
+    for _ in range(4):
+        synth.block()
+    noise_rms = None
+    index = 0
+    with open(cs8_file, "wb") as f:
+        while index < PILOT_SECONDS * rate:
+            with stage("modulate", hop):
+                iq = synth.block()
+            with stage("impair", hop):
+                if noise_rms is None:
+                    noise_rms = np.sqrt(np.mean(np.abs(iq) ** 2) / 10 ** (case["snr_db"] / 10) / 2)
+                noisy = iq + noise_rms * (rng.standard_normal(hop) + 1j * rng.standard_normal(hop))
+                noisy *= np.exp(2j * np.pi * case["offset_hz"] * (index + np.arange(hop)) / rate)
+                complex_to_cs8(noisy.astype(np.complex64)).tofile(f)
+            index += hop
+
+    out_rate = multi_tx.NTSC_SYNTH_RATE
+    with stage("channelize", index):
+        taps = {tap.ch_num: tap for tap in channelize.channelize(
+            cs8_file, SYNTH_CENTER, rate, out_rate, synth.fft_size, os.path.join(tmpdir, "ch"))}
+
+    # Video: visual carrier to 0 Hz, back to the composite rate, one frame
+    video = np.fromfile(taps[video_ch[0]].filename, dtype=np.complex64)
+    start = int(SYNTH_VIDEO_START * out_rate)
+    x = video[start:start + int(2.2 * len(composite) * out_rate / SAMP_RATE)]
+    x = x * np.exp(-2j * np.pi * (visual - taps[video_ch[0]].center_freq) * np.arange(len(x)) / out_rate)
+    up, down = multi_tx._rational(SAMP_RATE / out_rate, max_den=10000)
+    x = resample_poly(x, up, down).astype(np.complex64)
+    metrics = score_video(align_frame(x, composite, SAMP_RATE, len(composite) // 10), img)
+
+    # Pilot: tracker on the ATSC channel output, same loop as run_pilot
+    tracker = pilot_tracker.PilotTracker(out_rate, atsc_ch[1], decim1=50, decim2=24, estimate_file=None)
+    atsc = np.fromfile(taps[atsc_ch[0]].filename, dtype=np.complex64)
+    estimates = []
+    with stage("demod", len(atsc)):
+        for block in np.array_split(atsc, max(1, len(atsc) >> 20)):
+            estimates += tracker.process(block)
+    return {**metrics, **pilot_metrics(estimates, case["offset_hz"])}
+
+
+# === RUNNER ===
+
+def run_case(case):
+    import profiling
+
+    rng = np.random.default_rng(zlib.crc32(case["name"].encode()))
+    prof = profiling.enable(trace_memory=False)
+    t0 = time.perf_counter()
+    try:
+        if case["kind"] == "video":
+            metrics = run_video(case, rng)
+        elif case["kind"] == "audio":
+            with tempfile.TemporaryDirectory() as tmpdir:
+                metrics = run_audio(case, rng, tmpdir)
+        elif case["kind"] == "pilot":
+            metrics = run_pilot(case, rng)
+        elif case["kind"] == "synth":
+            with tempfile.TemporaryDirectory() as tmpdir:
+                metrics = run_synth(case, rng, tmpdir)
+        else:
+            raise ValueError(f"unknown case kind {case['kind']}")
+    finally:
+        profiling.disable()
+
+    stages = {}
+    for s in prof.stages:
+        entry = stages.setdefault(s["name"], {"wall_s": 0.0, "samples": 0})
+        entry["wall_s"] += s["wall_s"]
+        entry["samples"] += s["samples"] or 0
+    for entry in stages.values():
+        entry["msps"] = entry["samples"] / entry["wall_s"] / 1e6 if entry["wall_s"] > 0 else None
+    return {**case, **metrics, "wall_s": time.perf_counter() - t0, "stages": stages}
+
+
+def run_cases(cases, workers=WORKERS):
+    results = {}
+    if workers <= 1:
+        for case in cases:
+            results[case["name"]] = run_case(case)
+            print_result(results[case["name"]])
+        return results
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(run_case, case) for case in cases]
+        for future in as_completed(futures):
+            result = future.result()
+            results[result["name"]] = result
+            print_result(result)
+    return {case["name"]: results[case["name"]] for case in cases}
+
+
+def print_result(r):
+    metric = " ".join(f"{k} {r[k]:7.2f}" for k in METRICS if k in r)
+    demod = r["stages"].get("demod", {}).get("msps")
+    print(f"{r['name']:<30} {metric:<22} demod {demod or 0:7.2f} Msps  {r['wall_s']:6.2f} s")
+
+
+# === BASELINE ===
+
+def compare(results, baseline):
+    # Per case and metric: baseline, current, delta and a status
+    rows = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if b is None:
+            rows.append({"case": name, "metric": None, "status": "new"})
+            continue
+        for metric, (direction, tol) in METRICS.items():
+            if metric not in r or metric not in b:
+                continue
+            delta = r[metric] - b[metric]
+            if not np.isfinite(r[metric]) or direction * delta < -tol:
+                status = "REGRESSION"
+            elif direction * delta > tol:
+                status = "improved"
+            else:
+                status = "ok"
+            rows.append({"case": name, "metric": metric, "baseline": b[metric], "current": r[metric],
+                         "delta": delta, "status": status})
+        old = b["stages"].get("demod", {}).get("msps")
+        new = r["stages"].get("demod", {}).get("msps")
+        if old and new:
+            change = new / old - 1
+            rows.append({"case": name, "metric": "demod_msps", "baseline": old, "current": new,
+                         "delta": new - old,
+                         "status": "slower" if change < -THROUGHPUT_TOL else
+                                   "faster" if change > THROUGHPUT_TOL else "ok"})
+    for name in baseline:
+        if name not in results:
+            rows.append({"case": name, "metric": None, "status": "missing"})
+    return rows
+
+
+def print_comparison(rows):
+    print(f"\n{'case':<30} {'metric':<15} {'baseline':>10} {'current':>10} {'delta':>9}  status")
+    for row in rows:
+        if row["metric"] is None:
+            print(f"{row['case']:<30} {'':<15} {'':>10} {'':>10} {'':>9}  {row['status']}")
+        elif row["status"] != "ok":
+            print(f"{row['case']:<30} {row['metric']:<15} {row['baseline']:10.2f} {row['current']:10.2f} "
+                  f"{row['delta']:+9.2f}  {row['status']}")
+    counts = {}
+    for row in rows:
+        counts[row["status"]] = counts.get(row["status"], 0) + 1
+    print(", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
+
+
+def main():
+    parser = ArgumentParser(description="Encode/modulate/demodulate loopback regression run")
+    parser.add_argument("--kind", choices=["video", "audio", "pilot", "synth"], action="append",
+                        help="only run these case kinds (repeatable)")
+    parser.add_argument("--match", help="only run cases whose name contains this")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--results", default=RESULTS_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--compare", default=COMPARE_FILE, help="where to write the comparison")
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    args = parser.parse_args()
+
+    cases = [c for c in default_cases()
+             if (not args.kind or c["kind"] in args.kind) and (not args.match or args.match in c["name"])]
+    print(f"Running {len(cases)} loopback cases with {args.workers} worker(s)")
+    t0 = time.perf_counter()
+    results = run_cases(cases, args.workers)
+    print(f"Done in {time.perf_counter() - t0:.1f} s")
+
+    with open(args.results, "w") as f:
+        json.dump({"time": time.time(), "cases": results}, f, indent=2)
+    print(f"Saved results to {args.results}")
+
+    failed = False
+    for name, r in results.items():
+        for metric, floor in FLOORS.items():
+            if metric in r and not r[metric] >= floor:
+                print(f"{name}: {metric} {r[metric]:.2f} below {floor}")
+                failed = True
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["cases"]
+        if args.kind or args.match:
+            # Partial run: only compare the cases that were run
+            baseline = {name: b for name, b in baseline.items() if name in results}
+        rows = compare(results, baseline)
+        print_comparison(rows)
+        with open(args.compare, "w") as f:
+            json.dump({"baseline": args.baseline, "rows": rows}, f, indent=2)
+        print(f"Saved comparison to {args.compare}")
+        failed |= any(row["status"] == "REGRESSION" for row in rows)
+    elif not args.update_baseline:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"time": time.time(), "cases": results}, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
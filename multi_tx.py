@@ -0,0 +1,400 @@
+import numpy as np
+from scipy import fft
+from fractions import Fraction
+from argparse import ArgumentParser
+import time
+
+# Multi-channel wideband TX synthesizer.
+#
+# Each program (NTSC composite + aural FM, or FM-only audio) is generated at
+# its own baseband rate and then placed at its own offset inside one 20 Msps
+# stream.  Placement is done with a fast-convolution (overlap-save) synthesis
+# filter bank: every channel costs one small FFT at its own rate, and all
+# channels share a single large IFFT at the output rate.
+#
+# The per-channel FFT size is FFT_SIZE * rate / OUT_RATE and has to come out
+# exact: any rounding becomes a rate (and colour subcarrier) error on air.
+# NTSC_RATE (3^5 * 7 * 37 * 193 Hz) has no such size, so NTSC programs are
+# first resampled by 7000/7141 to NTSC_SYNTH_RATE (FFT sizes 40000 -> 23814,
+# both with small prime factors).  FM_RATE maps to 3840 exactly.
+#
+# The NTSC VSB filter is applied in the channel's FFT (its 255 taps are far
+# shorter than the overlap), on the real composite, and the aural carrier is
+# an FM channel of its own placed exactly 4.5 MHz above the visual carrier.
+
+# === SETTINGS ===
+OUT_RATE = 20_000_000           # HackRF TX rate, room for 2-3 6 MHz channels
+FFT_SIZE = 40000                # Output FFT size (bin width = OUT_RATE / FFT_SIZE = 500 Hz)
+MAX_RATE_ERROR_PPM = 1.0        # Per-channel rate error limit (NTSC allows +-10 Hz = 2.8 ppm at 3.58 MHz)
+HEADROOM = 0.9                  # Combined peak target (1.0 = int8 full scale)
+RELEASE = 0.01                  # Per-block gain recovery of the peak limiter
+PREFILL_BLOCKS = 100            # Output hops synthesized before TX starts (100 ms)
+TX_GAIN = 47
+
+# NTSC parameters, same as ntsc_hackrf.py / ntsc_encode.py
+NTSC_RATE = 772 * 60 * .999 * 525 / 2
+NTSC_SYNTH_RATE = 11_907_000    # NTSC_RATE * 7000 / 7141, exact in the synthesizer
+AURAL_OFFSET = 4.5e6            # Aural carrier above the visual carrier
+AURAL_AMPL = 0.11               # FM_ampl in ntsc_hackrf.py
+VIDEO_GAIN = 0.9                # digital_gain in ntsc_hackrf.py
+QUAD_RATE = 480_000             # FM modulation input rate
+FREQ_DEV = 75e3                 # Deviation for wideband FM (FM-only programs)
+AURAL_DEV = 25e3                # Deviation of the NTSC aural carrier
+NTSC_BAND = (-1.25e6, 4.5e6)    # Band copied for VSB video (edge tapers outside the VSB pass band)
+FM_RATE = QUAD_RATE * 4         # 1.92 Msps, TX_RATE of NTSC_AUDIO.py
+FM_BAND = (-120e3, 120e3)       # Carson bandwidth for 75 kHz deviation
+
+
+# === PROGRAM SOURCES ===
+
+def _rational(ratio, max_den=1000):
+    frac = Fraction(ratio).limit_denominator(max_den)
+    return frac.numerator, frac.denominator
+
+
+def load_audio(filename):
+    from scipy.io import wavfile
+    fs, audio = wavfile.read(filename)
+    if audio.ndim > 1:
+        audio = audio[:, 0]  # Use only one channel (mono)
+    audio = audio.astype(np.float32)
+    audio /= np.max(np.abs(audio))  # Normalize audio
+    return fs, audio
+
+
+def fm_modulate(audio, audio_rate, rate, deviation=FREQ_DEV):
+    # Same chain as NTSC_AUDIO.py, but kept in complex64 end to end
+    from scipy.signal import resample_poly
+    audio_quad = resample_poly(audio, QUAD_RATE, int(audio_rate)).astype(np.float32)
+    k = 2.0 * np.pi * deviation / QUAD_RATE
+    phase = np.cumsum(audio_quad, dtype=np.float64) * k
+    iq = np.exp(1j * phase).astype(np.complex64)
+    up, down = _rational(rate / QUAD_RATE)
+    return resample_poly(iq, up, down).astype(np.complex64)
+
+
+def vsb_filter(rate, num_taps=255, low=-2475000 + 1725000, high=4e6):
+    # Complex band pass of ntsc_hackrf.py, firdes.complex_band_pass(low, high):
+    # -0.75 .. +4.0 MHz around the visual carrier (vestigial lower sideband)
+    from scipy.signal import firwin
+    taps = firwin(num_taps, (high - low) / 2, width=500e3, window="hamming", fs=rate)
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    return (taps * np.exp(2j * np.pi * (high + low) / 2 * n / rate)).astype(np.complex64)
+
+
+class Resampler:
+    # Streaming rational resampler over a read(n) source, same filter as
+    # scipy's resample_poly.  Works in chunks of `blocks` * down input
+    # samples, re-filtering `down` samples of history each time; needs
+    # up <= down.
+
+    def __init__(self, read, up, down, blocks=16):
+        from scipy.signal import firwin
+        if up > down:
+            raise ValueError("Resampler only decimates (up <= down)")
+        self.read_input = read
+        self.up = up
+        self.down = down
+        half = 10 * down
+        self.taps = (up * firwin(2 * half + 1, 1.0 / down, window=("kaiser", 5.0))).astype(np.float32)
+        history = down * int(np.ceil(len(self.taps) / up / down))
+        self.x = np.zeros(history, dtype=np.float32)
+        self.chunk = blocks * down
+        self.pending = np.zeros(0, dtype=np.float32)
+
+    def read(self, n):
+        from scipy.signal import upfirdn
+        while len(self.pending) < n:
+            x = np.concatenate([self.x, self.read_input(self.chunk)])
+            self.x = x[-len(self.x):]
+            start = (len(x) - self.chunk) * self.up // self.down
+            y = upfirdn(self.taps, x, self.up, self.down)[start:start + self.chunk * self.up // self.down]
+            self.pending = np.concatenate([self.pending, y.astype(np.float32)])
+        out, self.pending = self.pending[:n], self.pending[n:]
+        return out
+
+
+class NtscSource:
+    # Streaming NTSC composite: ntsc_encode.py output (float32) memory-mapped
+    # and looped like the file_source in ntsc_hackrf.py, resampled to `rate`.
+    # Real valued; add_ntsc() has the synthesizer apply the VSB filter.
+
+    def __init__(self, composite_file, rate=NTSC_SYNTH_RATE):
+        self.composite = np.memmap(composite_file, dtype=np.float32, mode="r")
+        if len(self.composite) == 0:
+            raise ValueError(f"{composite_file} is empty")
+        self.rate = rate
+        self.read_composite = self._read_composite
+        if rate != NTSC_RATE:
+            up, down = _rational(rate / NTSC_RATE, max_den=10000)
+            self.read_composite = Resampler(self._read_composite, up, down).read
+        self.index = 0
+
+    def _read_composite(self, n):
+        out = np.empty(n, dtype=np.float32)
+        filled = 0
+        while filled < n:
+            take = min(n - filled, len(self.composite) - self.index)
+            out[filled:filled + take] = self.composite[self.index:self.index + take]
+            filled += take
+            self.index = (self.index + take) % len(self.composite)
+        return out
+
+    def read(self, n):
+        return self.read_composite(n) * np.float32(VIDEO_GAIN)
+
+
+def ntsc_program(composite_file, rate=NTSC_SYNTH_RATE):
+    return NtscSource(composite_file, rate)
+
+
+def fm_program(audio_file, rate=FM_RATE, deviation=FREQ_DEV):
+    fs, audio = load_audio(audio_file)
+    return fm_modulate(audio, fs, rate, deviation)
+
+
+def add_ntsc(synth, composite_file, audio_file=None, offset=0.0, gain=1.0):
+    # VSB visual carrier at `offset`, plus the aural carrier as its own FM
+    # channel AURAL_OFFSET above it; returns the visual channel
+    ch = synth.add_channel(ntsc_program(composite_file), NTSC_SYNTH_RATE, offset, gain, NTSC_BAND,
+                           taps=vsb_filter(NTSC_SYNTH_RATE))
+    if audio_file is not None:
+        synth.add_channel(fm_program(audio_file, deviation=AURAL_DEV), FM_RATE, ch.offset + AURAL_OFFSET,
+                          gain * AURAL_AMPL, FM_BAND)
+    return ch
+
+
+class LoopSource:
+    # Endless reader over a precomputed program, like the looping file
+    # sources in ntsc_hackrf.py and tx_callback in NTSC_AUDIO.py
+
+    def __init__(self, iq):
+        self.iq = np.asarray(iq, dtype=np.complex64)
+        self.index = 0
+
+    def read(self, n):
+        out = np.empty(n, dtype=np.complex64)
+        filled = 0
+        while filled < n:
+            take = min(n - filled, len(self.iq) - self.index)
+            out[filled:filled + take] = self.iq[self.index:self.index + take]
+            filled += take
+            self.index = (self.index + take) % len(self.iq)
+        return out
+
+
+# === SYNTHESIZER ===
+
+class Channel:
+
+    def __init__(self, source, rate, offset, gain, out_rate, fft_size, band=None, taper=0.05, taps=None):
+        self.source = source
+        self.rate = rate
+        self.gain = gain
+
+        # Input FFT size for the same block duration; it must come out (almost)
+        # exact, since rounding shifts every frequency in the program
+        self.n_in = 2 * int(round(fft_size * rate / out_rate / 2))
+        if self.n_in > fft_size:
+            raise ValueError("program rate %.0f exceeds output rate %.0f" % (rate, out_rate))
+        self.rate_error_ppm = (self.n_in * out_rate / fft_size / rate - 1) * 1e6
+        if abs(self.rate_error_ppm) > MAX_RATE_ERROR_PPM:
+            raise ValueError("program rate %.0f with FFT size %d has a %.1f ppm rate error (limit %.1f ppm); "
+                             "fft_size * rate / out_rate must be an even integer"
+                             % (rate, fft_size, self.rate_error_ppm, MAX_RATE_ERROR_PPM))
+
+        # Offsets land on output bins; the actual carrier is reported back
+        self.bin = int(round(offset * fft_size / out_rate))
+        self.offset = self.bin * out_rate / fft_size
+        half = self.n_in // 2
+
+        # Only the occupied band is copied across, so a 12 Msps program with
+        # a 7.6 MHz signal only takes 7.6 MHz of the output
+        if band is None:
+            lo, hi = -half, half - 1
+        else:
+            lo = int(np.ceil(band[0] * self.n_in / rate))
+            hi = int(np.floor(band[1] * self.n_in / rate))
+            lo, hi = max(lo, -half), min(hi, half - 1)
+        if self.bin + lo < -fft_size // 2 or self.bin + hi >= fft_size // 2:
+            raise ValueError("channel at %.3f MHz does not fit in the output band" % (offset / 1e6))
+
+        # Input bins (fftshift order) -> output bins, with a raised-cosine
+        # taper at the band edges to keep images and time aliasing down
+        k = np.arange(lo, hi + 1)
+        self.out_bins = (k + self.bin) % fft_size
+        self.in_bins = k % self.n_in
+        # Real sources take an rfft; negative bins are the conjugates
+        self.real_bins = np.abs(k)
+        self.negative = k < 0
+        edge = max(1, int(taper * len(k)))
+        ramp = 0.5 - 0.5 * np.cos(np.pi * (np.arange(edge) + 0.5) / edge)
+        mask = np.ones(len(k), dtype=np.float32)
+        mask[:edge] = ramp
+        mask[-edge:] = ramp[::-1]
+        self.mask = mask * np.float32(fft_size / self.n_in)
+        if taps is not None:
+            # FIR applied in the FFT; exact while it is short against the
+            # n_in / 4 samples of overlap on either side
+            if len(taps) > self.n_in // 4:
+                raise ValueError("filter of %d taps is too long for FFT size %d" % (len(taps), self.n_in))
+            self.mask = (self.mask * fft.fft(taps, self.n_in)[self.in_bins]).astype(np.complex64)
+
+        # Overlap-save history: 50% overlap at the input rate (real until a
+        # complex source replaces it)
+        self.history = np.zeros(half, dtype=np.float32)
+        # A bin shift of an odd number flips sign every half-block hop
+        self.hop_phase = 1.0 if self.bin % 2 == 0 else -1.0
+        self.phase = 1.0
+
+    def spectrum(self):
+        half = self.n_in // 2
+        new = self.source.read(half)
+        block = np.concatenate([self.history, new])
+        self.history = new
+        if np.isrealobj(block):
+            spec = fft.rfft(block)[self.real_bins]
+            spec[self.negative] = spec[self.negative].conj()
+        else:
+            spec = fft.fft(block)[self.in_bins]
+        spec *= self.mask * (self.gain * self.phase)
+        self.phase *= self.hop_phase
+        return spec
+
+
+class WidebandSynth:
+
+    def __init__(self, out_rate=OUT_RATE, fft_size=FFT_SIZE, headroom=HEADROOM, release=RELEASE):
+        self.out_rate = out_rate
+        self.fft_size = fft_size
+        self.headroom = headroom
+        self.release = release
+        self.channels = []
+        self.limit_gain = 1.0
+        self.clipped = 0
+        self.pending = np.zeros(0, dtype=np.int8)
+
+    def add_channel(self, source, rate, offset, gain=1.0, band=None, taps=None):
+        if not hasattr(source, "read"):
+            source = LoopSource(source)
+        ch = Channel(source, rate, offset, gain, self.out_rate, self.fft_size, band, taps=taps)
+        self.channels.append(ch)
+        return ch
+
+    def block(self):
+        # One output hop (fft_size / 2 samples) of the summed channels
+        n = self.fft_size
+        spec = np.zeros(n, dtype=np.complex64)
+        for ch in self.channels:
+            spec[ch.out_bins] += ch.spectrum()
+        out = fft.ifft(spec)[n // 4: 3 * n // 4]
+
+        # Combined peak control: attack instantly, release slowly
+        v = out.view(np.float32)        # interleaved I/Q
+        peak = max(v.max(), -v.min(), 1e-12)
+        target = self.headroom / peak
+        if target < self.limit_gain:
+            self.limit_gain = target
+        else:
+            self.limit_gain = min(target, self.limit_gain + self.release * (target - self.limit_gain), 1.0)
+        out *= np.float32(self.limit_gain)
+        return out
+
+    def cs8_block(self):
+        # complex64 is already interleaved I/Q, the cs8 byte order
+        v = np.round(self.block().view(np.float32) * np.float32(127))
+        self.clipped += int(np.count_nonzero(v > 127) + np.count_nonzero(v < -127))
+        return np.clip(v, -127, 127, out=v).astype(np.int8)
+
+    def read_cs8(self, length):
+        # Fixed-size reads for the HackRF tx_callback
+        while len(self.pending) < length:
+            self.pending = np.concatenate([self.pending, self.cs8_block()])
+        chunk, self.pending = self.pending[:length], self.pending[length:]
+        return chunk
+
+
+# === COMMAND LINE ===
+
+def parse_channel(spec):
+    # kind:file[:audio]@offset_hz[*gain], e.g. ntsc:test.dat:engineer.wav@-6e6*0.8
+    spec, _, gain = spec.partition("*")
+    spec, _, offset = spec.partition("@")
+    kind, *files = spec.split(":")
+    return kind, files, float(offset or 0), float(gain or 1.0)
+
+
+def main():
+    parser = ArgumentParser(description="Synthesize several TV/FM channels into one 20 Msps cs8 stream")
+    parser.add_argument("channel", nargs="+",
+                        help="ntsc:composite.dat[:audio.wav]@offset[*gain] or fm:audio.wav@offset[*gain]")
+    parser.add_argument("--freq", type=float, default=207e6, help="TX center frequency (Hz)")
+    parser.add_argument("--output", help="write cs8 to this file instead of transmitting")
+    parser.add_argument("--seconds", type=float, default=10.0, help="duration when writing a file")
+    parser.add_argument("--fft-size", type=int, default=FFT_SIZE)
+    args = parser.parse_args()
+
+    synth = WidebandSynth(fft_size=args.fft_size)
+    for spec in args.channel:
+        kind, files, offset, gain = parse_channel(spec)
+        if kind == "ntsc":
+            ch = add_ntsc(synth, *files, offset=offset, gain=gain)
+        elif kind == "fm":
+            ch = synth.add_channel(fm_program(files[0]), FM_RATE, offset, gain, FM_BAND)
+        else:
+            parser.error("unknown channel kind %r" % kind)
+        print(f"{kind} @ {(args.freq + ch.offset) / 1e6:.4f} MHz, gain {gain}, "
+              f"rate error {ch.rate_error_ppm:+.1f} ppm")
+
+    if args.output:
+        total = int(args.seconds * OUT_RATE) * 2
+        start = time.time()
+        with open(args.output, "wb") as f:
+            written = 0
+            while written < total:
+                chunk = synth.cs8_block()[:total - written]
+                f.write(chunk.tobytes())
+                written += len(chunk)
+        elapsed = time.time() - start
+        print(f"Wrote {args.seconds} s to {args.output} in {elapsed:.2f} s "
+              f"({args.seconds / elapsed:.2f}x real time), {synth.clipped} clipped")
+        return
+
+    from python_hackrf import pyhackrf  # type: ignore
+    pyhackrf.pyhackrf_init()
+    sdr = pyhackrf.pyhackrf_open()
+
+    sdr.pyhackrf_set_sample_rate(OUT_RATE)
+    sdr.pyhackrf_set_freq(int(args.freq))
+    sdr.pyhackrf_set_txvga_gain(TX_GAIN)
+    sdr.pyhackrf_set_amp_enable(True)
+
+    def tx_callback(device, buffer, length, ctx):
+        buffer[:length] = synth.read_cs8(length)
+        return 0
+
+    # Pre-fill (and time) PREFILL_BLOCKS before going on air
+    start = time.time()
+    while len(synth.pending) < PREFILL_BLOCKS * synth.fft_size:
+        synth.pending = np.concatenate([synth.pending, synth.cs8_block()])
+    speed = len(synth.pending) / 2 / OUT_RATE / (time.time() - start)
+    if speed < 1.0:
+        print(f"Warning: synthesis runs at {speed:.2f}x real time, the HackRF will underrun; "
+              f"render with --output and play the file instead")
+
+    sdr.set_tx_callback(tx_callback)
+    sdr.pyhackrf_start_tx()
+    print(f"Streaming {len(synth.channels)} channels around {args.freq / 1e6:.2f} MHz...")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print("Stopping...")
+        sdr.pyhackrf_stop_tx()
+        sdr.pyhackrf_close()
+        pyhackrf.pyhackrf_exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,6 @@
 # Boston, MA 02110-1301, USA.
 # Modified for video and improved sytax by VLadislav Fomitchev 2017
 
-from PIL import Image
 from array import array
 import math
 import sys
@@ -55,6 +54,11 @@ def main():
     #framecount = 4115
     #input_filename = "C:\\Users\\vladi\\Downloads\\SDR\\sdr-examples-master\\ntsc\\frames\\frame.png"
     #output_filename = "simpsons.dat"
+    encode(input_filename, output_filename, framecount)
+
+
+def encode(input_filename, output_filename, framecount=1):
+    from PIL import Image
 
     if framecount <= 1:
         image = Image.open(input_filename)
@@ -79,42 +83,49 @@ def main():
 
 
 
-def addBackPorch(ntsc_signal):
+def addBackPorch(ntsc_signal, burst=True):
     ntsc_signal += [BLANKING_LEVEL] * 13
-    l = len(ntsc_signal)
-    for x in range(l, l + 31):
-        ntsc_signal += [BLANKING_LEVEL + 20 * math.sin(math.pi + RADIANS_PER_SAMPLE * x)]
+    if burst:
+        l = len(ntsc_signal)
+        for x in range(l, l + 31):
+            ntsc_signal += [BLANKING_LEVEL + 20 * math.sin(math.pi + RADIANS_PER_SAMPLE * x)]
+    else:
+        # No colour burst: receivers switch to monochrome
+        ntsc_signal += [BLANKING_LEVEL] * 31
     ntsc_signal += [BLANKING_LEVEL] * 13
     return ntsc_signal
 
 
-def addNonVisibleLine(ntsc_signal):
+def addNonVisibleLine(ntsc_signal, burst=True):
     ntsc_signal += SYNCH_PULSE
-    ntsc_signal = addBackPorch(ntsc_signal)
+    ntsc_signal = addBackPorch(ntsc_signal, burst)
     ntsc_signal += [BLANKING_LEVEL] * 658
     return ntsc_signal
 
 
-def addFirstHalfFrame(ntsc_signal):
+def addFirstHalfFrame(ntsc_signal, burst=True):
     ntsc_signal += SYNCH_PULSE
-    ntsc_signal = addBackPorch(ntsc_signal)
+    ntsc_signal = addBackPorch(ntsc_signal, burst)
     ntsc_signal += [BLACK_LEVEL] * 272
     return ntsc_signal
 
 
-def addSecondHalfFrame(ntsc_signal):
+def addSecondHalfFrame(ntsc_signal, burst=True):
     ntsc_signal += SYNCH_PULSE
-    ntsc_signal = addBackPorch(ntsc_signal)
+    ntsc_signal = addBackPorch(ntsc_signal, burst)
     ntsc_signal += [BLANKING_LEVEL] * 272 + [BLACK_LEVEL] * 368 + FRONT_PORCH
     return ntsc_signal
 
 
-def addPixel(ntsc_signal, p):
+def addPixel(ntsc_signal, p, chroma=True):
     Er = float(p[0]) / 255
     Eg = float(p[1]) / 255
     Eb = float(p[2]) / 255
 
     Ey = 0.30 * Er + 0.59 * Eg + 0.11 * Eb
+    if not chroma:
+        ntsc_signal += [BLACK_LEVEL + (WHITE_LEVEL - BLACK_LEVEL) * Ey]
+        return ntsc_signal
     Eq = 0.41 * (Eb - Ey) + 0.48 * (Er - Ey)
     Ei = -0.27 * (Eb - Ey) + 0.74 * (Er - Ey)
 
@@ -126,30 +137,32 @@ def addPixel(ntsc_signal, p):
     return ntsc_signal
 
 
-def genFields(pixels):
+def genFields(pixels, chroma=True):
+    # chroma=False encodes luma only, without colour burst (cheaper; used by
+    # tx_scheduler.py when the encoder falls behind)
     # Generate even field
     ntsc_signal = []
     ntsc_signal += INTERVALS
     for x in range(13):
-        ntsc_signal = addNonVisibleLine(ntsc_signal)
+        ntsc_signal = addNonVisibleLine(ntsc_signal, chroma)
     for line in range(0, 480, 2):
         ntsc_signal += SYNCH_PULSE
-        ntsc_signal = addBackPorch(ntsc_signal)
+        ntsc_signal = addBackPorch(ntsc_signal, chroma)
         for x in range(line * 640, (line + 1) * 640):
-            ntsc_signal = addPixel(ntsc_signal, pixels[x])
+            ntsc_signal = addPixel(ntsc_signal, pixels[x], chroma)
         ntsc_signal += FRONT_PORCH
-    ntsc_signal = addFirstHalfFrame(ntsc_signal)
+    ntsc_signal = addFirstHalfFrame(ntsc_signal, chroma)
 
     # Generate odd field
     ntsc_signal += INTERVALS + EXTRA_HALF_LINE
     for x in range(12):
-        ntsc_signal = addNonVisibleLine(ntsc_signal)
-    ntsc_signal = addSecondHalfFrame(ntsc_signal)
+        ntsc_signal = addNonVisibleLine(ntsc_signal, chroma)
+    ntsc_signal = addSecondHalfFrame(ntsc_signal, chroma)
     for line in range(1, 481, 2):
         ntsc_signal += SYNCH_PULSE
-        ntsc_signal = addBackPorch(ntsc_signal)
+        ntsc_signal = addBackPorch(ntsc_signal, chroma)
         for x in range(line * 640, (line + 1) * 640):
-            ntsc_signal = addPixel(ntsc_signal, pixels[x])
+            ntsc_signal = addPixel(ntsc_signal, pixels[x], chroma)
         ntsc_signal += FRONT_PORCH
 
     ntsc_signal = [0.75 - (0.25 / 40) * x for x in ntsc_signal]
@@ -162,6 +175,7 @@ def writeFile(ntsc_signal, filename, mode):
     ntsc_array.tofile(f)
     f.close()
 
-main()
+if __name__ == "__main__":
+    main()
 
 # image = Image.open("smpte-bars.png")
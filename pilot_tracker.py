@@ -0,0 +1,282 @@
+import numpy as np
+from scipy import signal
+from argparse import ArgumentParser
+import json
+import math
+import os
+import time
+
+# Streaming ATSC pilot tracker.
+#
+# Works block by block with bounded memory, instead of filtering and
+# resampling the whole capture like get_pilot.py:
+#   1. NCO mix of the nominal pilot to 0 Hz (phase continuous across blocks)
+#   2. boxcar decimation 20 MHz -> 200 kHz, then FIR decimation -> 10 kHz
+#   3. zoom FFT over a ring buffer to acquire the pilot and measure SNR
+#   4. second-order PLL for fine frequency and phase noise
+# Estimates are produced at UPDATE_RATE and written to ESTIMATE_FILE, so other
+# tools can correct their tuning with pilot_correction().
+
+# === SETTINGS ===
+SAMPLE_RATE = 20e6
+CENTER_FREQ = 201e6             # Tuned to the channel center (channel 11)
+PILOT_OFFSET = -3e6 + 309_441   # ATSC pilot relative to channel center (Hz)
+DECIM1 = 100                    # Boxcar stage: 20 MHz -> 200 kHz
+DECIM2 = 20                     # FIR stage: 200 kHz -> 10 kHz
+FFT_SIZE = 4096                 # Zoom FFT (2.4 Hz bins at 10 kHz)
+SEARCH_HZ = 3e3                 # Pilot search range around nominal
+UPDATE_RATE = 2.0               # Estimates per second
+LOOP_BW = 10.0                  # PLL noise bandwidth (Hz)
+ESTIMATE_FILE = "pilot_estimate.json"
+
+
+class PilotTracker:
+
+    def __init__(self, sample_rate=SAMPLE_RATE, center_freq=CENTER_FREQ, pilot_offset=PILOT_OFFSET,
+                 decim1=DECIM1, decim2=DECIM2, fft_size=FFT_SIZE, search_hz=SEARCH_HZ,
+                 update_rate=UPDATE_RATE, loop_bw=LOOP_BW, estimate_file=ESTIMATE_FILE):
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.pilot_offset = pilot_offset
+        self.decim1 = decim1
+        self.decim2 = decim2
+        self.rate = sample_rate / decim1 / decim2
+        self.fft_size = fft_size
+        self.search_hz = search_hz
+        self.update_every = int(self.rate / update_rate)
+        self.estimate_file = estimate_file
+        self.callbacks = []
+
+        # Stage 1: NCO + boxcar decimation
+        self.nco_phase = 0.0
+        self.nco_step = -2 * np.pi * pilot_offset / sample_rate
+        self.carry = np.zeros(0, dtype=np.complex64)
+        self.rotators = {}              # cached NCO tables, keyed by block length
+
+        # Stage 2: FIR low pass + decimation, state carried between blocks
+        rate1 = sample_rate / decim1
+        self.taps = signal.firwin(8 * decim2 + 1, 0.4 * self.rate, fs=rate1)
+        self.zi = np.zeros(len(self.taps) - 1, dtype=np.complex128)
+        self.phase2 = 0
+
+        # Stage 3: zoom FFT ring buffer
+        self.ring = np.zeros(fft_size, dtype=np.complex64)
+        self.ring_pos = 0
+        self.ring_filled = 0
+        self.window = signal.get_window("hann", fft_size).astype(np.float32)
+        self.bin_hz = self.rate / fft_size
+
+        # Stage 4: PLL (zeta = 0.707), gains per sample at the decimated rate
+        zeta = 0.707
+        wn = 2 * loop_bw / (zeta + 1 / (4 * zeta))
+        T = 1 / self.rate
+        self.kp = 2 * zeta * wn * T
+        self.ki = (wn * T) ** 2
+        self.pll_phase = 0.0
+        self.pll_freq = 0.0             # rad/sample
+        self.pll_err_sq = 0.0
+        self.pll_count = 0
+        self.locked = False
+
+        self.since_update = 0
+        self.estimate = None
+
+    def on_update(self, callback):
+        self.callbacks.append(callback)
+
+    def _decimate(self, iq):
+        # NCO mix of the nominal pilot to DC; blocks are usually the same
+        # length, so the rotator table is computed once and re-phased
+        n = len(iq)
+        rotator = self.rotators.get(n)
+        if rotator is None:
+            rotator = np.exp(1j * self.nco_step * np.arange(n)).astype(np.complex64)
+            self.rotators = {n: rotator}
+        mixed = iq * rotator
+        mixed *= np.complex64(np.exp(1j * self.nco_phase))
+        self.nco_phase = (self.nco_phase + self.nco_step * n) % (2 * np.pi)
+
+        # Boxcar decimation; leftovers carried into the next block
+        if len(self.carry):
+            mixed = np.concatenate([self.carry, mixed])
+        usable = len(mixed) - len(mixed) % self.decim1
+        self.carry = mixed[usable:]
+        stage1 = mixed[:usable].reshape(-1, self.decim1).mean(axis=1)
+
+        # FIR decimation with filter state
+        filtered, self.zi = signal.lfilter(self.taps, 1.0, stage1, zi=self.zi)
+        out = filtered[self.phase2::self.decim2]
+        self.phase2 = (self.phase2 - len(filtered)) % self.decim2
+        return out.astype(np.complex64)
+
+    def _pll(self, x):
+        phase, freq = self.pll_phase, self.pll_freq
+        kp, ki = self.kp, self.ki
+        err_sq = 0.0
+        for s in x.tolist():
+            err = math.atan2(s.imag, s.real) - phase
+            err = (err + math.pi) % (2 * math.pi) - math.pi
+            freq += ki * err
+            phase += freq + kp * err
+            err_sq += err * err
+        self.pll_phase = phase % (2 * math.pi)
+        self.pll_freq = freq
+        self.pll_err_sq += err_sq
+        self.pll_count += len(x)
+
+    def _zoom_fft(self):
+        ordered = np.roll(self.ring, -self.ring_pos)
+        spec = np.fft.fftshift(np.fft.fft(ordered * self.window))
+        psd = np.abs(spec) ** 2
+        freqs = np.fft.fftshift(np.fft.fftfreq(self.fft_size, 1 / self.rate))
+        search = np.abs(freqs) <= self.search_hz
+        k = np.flatnonzero(search)[np.argmax(psd[search])]
+
+        # Parabolic interpolation on the log spectrum
+        if 0 < k < self.fft_size - 1:
+            a, b, c = np.log(psd[k - 1:k + 2] + 1e-30)
+            delta = 0.5 * (a - c) / (a - 2 * b + c)
+        else:
+            delta = 0.0
+        freq = freqs[k] + delta * self.rate / self.fft_size
+
+        # Pilot power over the main lobe, noise per bin from the median of the
+        # rest of the search range (median of exponential = mean * ln 2)
+        pilot = psd[max(k - 2, 0):k + 3].sum()
+        noise_bins = search.copy()
+        noise_bins[max(k - 10, 0):k + 11] = False
+        noise = np.median(psd[noise_bins]) / np.log(2) if noise_bins.any() else 1e-30
+        return freq, pilot, noise
+
+    def _update(self):
+        fft_freq, pilot, noise = self._zoom_fft()
+        phase_rms = math.sqrt(self.pll_err_sq / max(self.pll_count, 1))
+        pll_freq = self.pll_freq * self.rate / (2 * np.pi)
+        self.locked = phase_rms < 0.5 and abs(pll_freq - fft_freq) < 2 * self.bin_hz
+
+        # Re-seed the PLL from the FFT whenever it is not locked
+        if not self.locked:
+            self.pll_freq = 2 * np.pi * fft_freq / self.rate
+        freq_error = pll_freq if self.locked else fft_freq
+
+        # The main-lobe sum already holds the window's energy, so the noise
+        # density is the per-bin noise over one bin width.  SNR is quoted in
+        # the decimated bandwidth.
+        cn0 = 10 * np.log10(pilot / (noise / self.bin_hz))
+
+        self.estimate = {
+            "time": time.time(),
+            "center_freq": self.center_freq,
+            "pilot_freq": self.center_freq + self.pilot_offset + freq_error,
+            "freq_error_hz": freq_error,
+            "freq_error_ppm": freq_error / self.center_freq * 1e6,
+            "pilot_snr_db": cn0 - 10 * np.log10(self.rate),
+            "cn0_dbhz": cn0,
+            "phase_noise_rad": phase_rms,
+            "locked": bool(self.locked),
+        }
+        self.pll_err_sq = 0.0
+        self.pll_count = 0
+
+        if self.estimate_file:
+            tmp = self.estimate_file + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.estimate, f, indent=2)
+            os.replace(tmp, self.estimate_file)
+        for callback in self.callbacks:
+            callback(self.estimate)
+        return self.estimate
+
+    def process(self, iq):
+        # Feed one block of IQ at SAMPLE_RATE; returns estimates made during it
+        x = self._decimate(iq)
+        estimates = []
+        while len(x):
+            take = min(len(x), self.update_every - self.since_update)
+            chunk, x = x[:take], x[take:]
+
+            end = self.ring_pos + len(chunk)
+            if end <= self.fft_size:
+                self.ring[self.ring_pos:end] = chunk
+            else:
+                split = self.fft_size - self.ring_pos
+                self.ring[self.ring_pos:] = chunk[:split]
+                self.ring[:end - self.fft_size] = chunk[split:]
+            self.ring_pos = end % self.fft_size
+            self.ring_filled = min(self.ring_filled + len(chunk), self.fft_size)
+
+            self._pll(chunk)
+            self.since_update += len(chunk)
+            if self.since_update >= self.update_every and self.ring_filled == self.fft_size:
+                self.since_update = 0
+                estimates.append(self._update())
+            elif self.since_update >= self.update_every:
+                self.since_update = 0
+        return estimates
+
+
+def pilot_correction(estimate_file=ESTIMATE_FILE, max_age=None):
+    # Frequency error (Hz) measured by a running tracker, or 0.0 if there is
+    # no fresh locked estimate.  Tune to center_freq + pilot_correction() to
+    # put the channel where it should be.
+    try:
+        with open(estimate_file) as f:
+            estimate = json.load(f)
+    except (OSError, ValueError):
+        return 0.0
+    if not estimate.get("locked"):
+        return 0.0
+    if max_age is not None and time.time() - estimate["time"] > max_age:
+        return 0.0
+    return estimate["freq_error_hz"]
+
+
+def print_estimate(e):
+    print(f"pilot {e['pilot_freq']/1e6:.6f} MHz  error {e['freq_error_hz']:+8.1f} Hz "
+          f"({e['freq_error_ppm']:+.2f} ppm)  SNR {e['pilot_snr_db']:5.1f} dB  "
+          f"C/N0 {e['cn0_dbhz']:5.1f} dB-Hz  phase noise {np.degrees(e['phase_noise_rad']):5.1f} deg"
+          f"{'' if e['locked'] else '  (acquiring)'}")
+
+
+def main():
+    parser = ArgumentParser(description="Track the ATSC pilot: frequency error, phase noise and SNR")
+    parser.add_argument("--file", help="read a cs8 capture instead of live IQ")
+    parser.add_argument("--broker", nargs="?", const="/tmp/hackrf_iq.sock",
+                        help="subscribe to iq_broker.py instead of opening the HackRF")
+    parser.add_argument("--freq", type=float, default=CENTER_FREQ, help="tuned center frequency (Hz)")
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE)
+    parser.add_argument("--pilot-offset", type=float, default=PILOT_OFFSET,
+                        help="nominal pilot offset from the tuned frequency (Hz)")
+    parser.add_argument("--update-rate", type=float, default=UPDATE_RATE)
+    parser.add_argument("--estimate-file", default=ESTIMATE_FILE)
+    args = parser.parse_args()
+
+    tracker = PilotTracker(args.rate, args.freq, args.pilot_offset,
+                           update_rate=args.update_rate, estimate_file=args.estimate_file)
+    tracker.on_update(print_estimate)
+
+    if args.file:
+        from channelize import read_cs8_blocks
+        for iq in read_cs8_blocks(args.file, 1 << 18):
+            tracker.process(iq)
+    elif args.broker:
+        from iq_broker import IQSubscriber
+        for header, iq in IQSubscriber(args.broker):
+            tracker.process(iq)
+    else:
+        import asyncio
+        from async_hackrf import AsyncHackRF
+
+        async def run():
+            async with AsyncHackRF(sample_rate=args.rate, center_freq=args.freq) as sdr:
+                async for iq in sdr.rx():
+                    await sdr.run_dsp(tracker.process, iq)
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            print("Stopping...")
+
+
+if __name__ == "__main__":
+    main()
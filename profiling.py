@@ -0,0 +1,169 @@
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Opt-in per-stage profiling for the offline pipelines (test.py, get_pilot.py).
+#
+# Pipeline code marks its stages with
+#
+#   with stage("channel filter", len(iq_samples)) as s:
+#       filtered = ...
+#       s.arrays(filtered)
+#
+# which costs nothing unless a profiler is enabled:
+#
+#   prof = profiling.enable()
+#   test.analyze()
+#   prof.report(); prof.save_json("profile.json"); prof.save_trace("trace.json")
+#
+# Each stage records wall and CPU time, samples/sec, the tracemalloc peak and
+# net change during the stage, process RSS, and the shape/dtype/size of the
+# arrays it produced.  numpy reports its buffers to tracemalloc, so large
+# intermediates (complex128 copies, full-length resamples) show up directly.
+
+_active = None
+
+
+def _rss():
+    # Current resident set size in bytes (Linux), else the peak from getrusage
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def _describe(a):
+    shape = "x".join(str(n) for n in a.shape)
+    return {"dtype": str(a.dtype), "shape": shape, "bytes": int(a.nbytes)}
+
+
+class StageHandle:
+
+    def __init__(self, name, samples):
+        self.name = name
+        self.samples = samples
+        self.outputs = []
+
+    def arrays(self, *arrays):
+        for a in arrays:
+            if hasattr(a, "nbytes") and hasattr(a, "dtype"):
+                self.outputs.append(_describe(a))
+
+
+class _NullHandle:
+
+    def arrays(self, *arrays):
+        pass
+
+
+_NULL = _NullHandle()
+
+
+class Profiler:
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.stages = []
+        self.origin = time.perf_counter()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, samples=None):
+        handle = StageHandle(name, samples)
+        if self.trace_memory:
+            mem_before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        rss_before = _rss()
+        t0 = time.perf_counter()
+        c0 = time.process_time()
+        try:
+            yield handle
+        finally:
+            wall = time.perf_counter() - t0
+            cpu = time.process_time() - c0
+            rss_after = _rss()
+            entry = {
+                "name": name,
+                "start": t0 - self.origin,
+                "wall_s": wall,
+                "cpu_s": cpu,
+                "samples": handle.samples,
+                "samples_per_s": handle.samples / wall if handle.samples and wall > 0 else None,
+                "rss_bytes": rss_after,
+                "rss_delta_bytes": rss_after - rss_before,
+                "arrays": handle.outputs,
+            }
+            if self.trace_memory:
+                mem_after, peak = tracemalloc.get_traced_memory()
+                entry["peak_bytes"] = peak - mem_before
+                entry["delta_bytes"] = mem_after - mem_before
+            self.stages.append(entry)
+
+    def report(self, file=None):
+        file = file or sys.stdout
+        mb = 1 / 2**20
+        header = (f"{'stage':<16} {'wall s':>8} {'cpu s':>8} {'Msps':>8} {'peak MB':>9} "
+                  f"{'+MB':>8} {'RSS MB':>8}  arrays")
+        print(header, file=file)
+        print("-" * len(header), file=file)
+        for s in self.stages:
+            rate = f"{s['samples_per_s'] / 1e6:8.2f}" if s["samples_per_s"] else f"{'':>8}"
+            peak = f"{s['peak_bytes'] * mb:9.1f}" if "peak_bytes" in s else f"{'':>9}"
+            delta = f"{s['delta_bytes'] * mb:+8.1f}" if "delta_bytes" in s else f"{'':>8}"
+            arrays = ", ".join(f"{a['dtype']}[{a['shape']}] {a['bytes'] * mb:.1f}MB" for a in s["arrays"])
+            print(f"{s['name']:<16} {s['wall_s']:8.3f} {s['cpu_s']:8.3f} {rate} {peak} {delta} "
+                  f"{s['rss_bytes'] * mb:8.1f}  {arrays}", file=file)
+        total_wall = sum(s["wall_s"] for s in self.stages)
+        total_cpu = sum(s["cpu_s"] for s in self.stages)
+        print(f"{'total':<16} {total_wall:8.3f} {total_cpu:8.3f}", file=file)
+
+    def save_json(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"stages": self.stages}, f, indent=2)
+
+    def save_trace(self, filename):
+        # Chrome trace event format (chrome://tracing, Perfetto)
+        events = []
+        for s in self.stages:
+            args = {k: v for k, v in s.items() if k not in ("name", "start", "wall_s")}
+            events.append({
+                "name": s["name"], "ph": "X", "pid": os.getpid(), "tid": 0,
+                "ts": s["start"] * 1e6, "dur": s["wall_s"] * 1e6, "args": args,
+            })
+            if "peak_bytes" in s:
+                events.append({
+                    "name": "memory", "ph": "C", "pid": os.getpid(), "tid": 0, "ts": s["start"] * 1e6,
+                    "args": {"peak_MB": s["peak_bytes"] / 2**20, "rss_MB": s["rss_bytes"] / 2**20},
+                })
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+@contextmanager
+def stage(name, samples=None):
+    if _active is None:
+        yield _NULL
+        return
+    with _active.stage(name, samples) as handle:
+        yield handle
+
+
+def enable(trace_memory=True):
+    global _active
+    _active = Profiler(trace_memory)
+    return _active
+
+
+def disable():
+    global _active
+    prof, _active = _active, None
+    if prof is not None and prof.trace_memory:
+        tracemalloc.stop()
+    return prof
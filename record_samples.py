@@ -1,7 +1,4 @@
-from python_hackrf import pyhackrf  # type: ignore
 import time
-import numpy as np
-import matplotlib.pyplot as plt
 
 # Configuration
 center_freq = 198e6        # DTV Channel 11 center frequency (Hz)
@@ -10,80 +7,113 @@ baseband_filter = sample_rate / 2    # Baseband filter bandwidth (Hz)
 recording_time = 1.0         # Record for 5 seconds (longer than before)
 lna_gain = 32
 vga_gain = 0
+filename = "dtv_channel_iq_raw.bin"
 
-# Initialize HackRF
-pyhackrf.pyhackrf_init()
-sdr = pyhackrf.pyhackrf_open()
 
-allowed_baseband = pyhackrf.pyhackrf_compute_baseband_filter_bw_round_down_lt(baseband_filter)
-sdr.pyhackrf_set_sample_rate(sample_rate)
-sdr.pyhackrf_set_baseband_filter_bandwidth(allowed_baseband)
-sdr.pyhackrf_set_freq(center_freq)
-sdr.pyhackrf_set_amp_enable(False)
-sdr.pyhackrf_set_lna_gain(lna_gain)
-sdr.pyhackrf_set_vga_gain(vga_gain)
+def record(filename=filename, center_freq=center_freq, sample_rate=sample_rate,
+           recording_time=recording_time, lna_gain=lna_gain, vga_gain=vga_gain,
+           baseband_filter=baseband_filter, indexed=False):
+    from python_hackrf import pyhackrf  # type: ignore
 
-print(f"Tuning to {center_freq/1e6} MHz with sample rate {sample_rate/1e6} MHz")
+    # Initialize HackRF
+    pyhackrf.pyhackrf_init()
+    sdr = pyhackrf.pyhackrf_open()
 
-# Open file to write raw IQ samples (int8 interleaved)
-filename = "dtv_channel_iq_raw.bin"
-f = open(filename, "wb")
+    allowed_baseband = pyhackrf.pyhackrf_compute_baseband_filter_bw_round_down_lt(baseband_filter)
+    sdr.pyhackrf_set_sample_rate(sample_rate)
+    sdr.pyhackrf_set_baseband_filter_bandwidth(allowed_baseband)
+    sdr.pyhackrf_set_freq(center_freq)
+    sdr.pyhackrf_set_amp_enable(False)
+    sdr.pyhackrf_set_lna_gain(lna_gain)
+    sdr.pyhackrf_set_vga_gain(vga_gain)
 
-def rx_callback(device, buffer, buffer_length, valid_length):
-    # Write valid bytes from buffer directly to file
-    f.write(buffer[:valid_length].tobytes())
-    return 0
+    print(f"Tuning to {center_freq/1e6} MHz with sample rate {sample_rate/1e6} MHz")
 
-# Set callback and start streaming
-sdr.set_rx_callback(rx_callback)
-sdr.pyhackrf_start_rx()
-print("Started streaming...")
+    # Open file to write raw IQ samples (int8 interleaved), or an indexed
+    # recording with metadata (iq_container.py)
+    if indexed:
+        import os
+        from iq_container import RecordingWriter
+        f = RecordingWriter(os.path.splitext(filename)[0], sample_rate, center_freq,
+                            lna_gain=lna_gain, vga_gain=vga_gain)
+    else:
+        f = open(filename, "wb")
 
-time.sleep(recording_time)  # Record for specified time
+    def rx_callback(device, buffer, buffer_length, valid_length):
+        # Write valid bytes from buffer directly to file
+        f.write(buffer[:valid_length].tobytes())
+        return 0
 
-sdr.pyhackrf_stop_rx()
-print("Stopped streaming")
+    # Set callback and start streaming
+    sdr.set_rx_callback(rx_callback)
+    sdr.pyhackrf_start_rx()
+    print("Started streaming...")
 
-# Cleanup
-sdr.pyhackrf_close()
-pyhackrf.pyhackrf_exit()
-f.close()
-print(f"Raw IQ samples saved to {filename}")
+    time.sleep(recording_time)  # Record for specified time
 
-# === Optional: Post-process raw file to load IQ samples and plot ===
+    sdr.pyhackrf_stop_rx()
+    print("Stopped streaming")
 
-# Load raw data as int8
-raw_data = np.fromfile(filename, dtype=np.int8)
-
-# Convert to complex64 IQ samples (interleaved IQ)
-iq_samples = raw_data[0::2] + 1j * raw_data[1::2]
-iq_samples = iq_samples.astype(np.complex64) / 128.0  # normalize to [-1,1]
-
-# Plot time domain
-plt.figure()
-plt.plot(np.real(iq_samples[:5000]), label='Real')
-plt.plot(np.imag(iq_samples[:5000]), label='Imag')
-plt.title("Time Domain")
-plt.xlabel("Sample Index")
-plt.ylabel("Amplitude")
-plt.legend()
-plt.tight_layout()
-plt.savefig("dtv_channel_time.png")
-print("Saved time domain plot as dtv_channel11_time.png")
-
-# Plot frequency domain
-fft_size = 16384
-fft_data = np.fft.fftshift(np.fft.fft(iq_samples[:fft_size]))
-power_db = 10 * np.log10(np.abs(fft_data)**2 + 1e-12)
-freq_axis = np.linspace(center_freq - sample_rate/2, center_freq + sample_rate/2, fft_size) / 1e6
-
-plt.figure()
-plt.plot(freq_axis, power_db)
-plt.title("Frequency Domain")
-plt.xlabel("Frequency [MHz]")
-plt.ylabel("Power [dB]")
-plt.grid()
-plt.tight_layout()
-plt.savefig("dtv_channel_freq.png")
-print("Saved frequency domain plot as dtv_channel_freq.png")
+    # Cleanup
+    sdr.pyhackrf_close()
+    pyhackrf.pyhackrf_exit()
+    f.close()
+    print(f"Raw IQ samples saved to {f.name + '.sigmf-data' if indexed else filename}")
+
+
+# === Optional: Post-process raw file to load IQ samples and plot ===
 
+def plot(filename=filename, center_freq=center_freq, sample_rate=sample_rate):
+    import os
+    import numpy as np
+    import matplotlib.pyplot as plt
+
+    fft_size = 16384
+    name = os.path.splitext(filename)[0]
+    if os.path.exists(name + ".sigmf-meta"):
+        # Indexed recording (record(indexed=True)): there is no bare .bin, and
+        # the rate and frequency come from its metadata
+        from iq_container import Recording
+        recording = Recording(name)
+        sample_rate = recording.sample_rate
+        center_freq = recording.captures[0]["core:frequency"]
+        iq_samples = recording.read(0, fft_size)
+    else:
+        # Load raw data as int8
+        raw_data = np.fromfile(filename, dtype=np.int8)
+
+        # Convert to complex64 IQ samples (interleaved IQ)
+        iq_samples = raw_data[0::2] + 1j * raw_data[1::2]
+        iq_samples = iq_samples.astype(np.complex64) / 128.0  # normalize to [-1,1]
+
+    # Plot time domain
+    plt.figure()
+    plt.plot(np.real(iq_samples[:5000]), label='Real')
+    plt.plot(np.imag(iq_samples[:5000]), label='Imag')
+    plt.title("Time Domain")
+    plt.xlabel("Sample Index")
+    plt.ylabel("Amplitude")
+    plt.legend()
+    plt.tight_layout()
+    plt.savefig("dtv_channel_time.png")
+    print("Saved time domain plot as dtv_channel11_time.png")
+
+    # Plot frequency domain
+    fft_data = np.fft.fftshift(np.fft.fft(iq_samples[:fft_size]))
+    power_db = 10 * np.log10(np.abs(fft_data)**2 + 1e-12)
+    freq_axis = np.linspace(center_freq - sample_rate/2, center_freq + sample_rate/2, fft_size) / 1e6
+
+    plt.figure()
+    plt.plot(freq_axis, power_db)
+    plt.title("Frequency Domain")
+    plt.xlabel("Frequency [MHz]")
+    plt.ylabel("Power [dB]")
+    plt.grid()
+    plt.tight_layout()
+    plt.savefig("dtv_channel_freq.png")
+    print("Saved frequency domain plot as dtv_channel_freq.png")
+
+
+if __name__ == "__main__":
+    record()
+    plot()
@@ -0,0 +1,250 @@
+import numpy as np
+import os
+import time
+from argparse import ArgumentParser
+from collections import deque
+from functools import lru_cache
+
+# Whole-recording spectrum summary for cs8 captures (record_samples.py output
+# or an indexed recording from iq_container.py).
+#
+# record_samples.py and test.py plot one FFT from the first few ms.  This
+# streams through the entire capture instead, in independent blocks of FFT
+# frames spread over a process pool, and keeps only fixed-size accumulators:
+#
+#   psd       Welch average (Hann window, 50% overlap) over every frame
+#   maxhold   per-bin maximum over every frame
+#   waterfall WATERFALL_ROWS x WATERFALL_COLS power averages, whatever the
+#             capture length (each row averages a run of consecutive frames,
+#             each column a run of adjacent bins)
+#
+# Memory is bounded by the accumulators plus BLOCK_FRAMES frames per busy
+# worker; the PNG is drawn from the decimated waterfall, never from a full
+# spectrogram.  Output is <prefix>.npz (+ <prefix>.png).
+
+# === SETTINGS ===
+INPUT_FILE = "dtv_channel_iq_raw.bin"
+CENTER_FREQ = 198e6             # Used for bare .bin captures (indexed recordings carry their own)
+SAMPLE_RATE = 20e6
+FFT_SIZE = 4096                 # Frame length; hop is FFT_SIZE // 2
+WINDOW = "hann"
+WATERFALL_ROWS = 600            # Image height (time), fixed
+WATERFALL_COLS = 1024           # Image width (frequency), must divide FFT_SIZE
+BLOCK_FRAMES = 2048             # Frames per worker task (~4M samples at FFT_SIZE 4096)
+BATCH_FRAMES = 128              # Frames per FFT call inside a task
+WORKERS = os.cpu_count() or 1
+OUTPUT_PREFIX = "spectrum_summary"
+
+# Per-process open sources, so a worker maps the file once, not once per task
+_sources = {}
+
+
+@lru_cache(maxsize=None)
+def _window(kind, fft_size):
+    from scipy.signal import get_window
+    w = get_window(kind, fft_size).astype(np.float32)
+    return w, float(np.sum(w.astype(np.float64) ** 2))
+
+
+def _open_source(path):
+    # Returns read_raw(start, count) -> int8 interleaved cs8
+    if path not in _sources:
+        if path.endswith(".sigmf-meta"):
+            from iq_container import Recording
+            _sources[path] = Recording(path).read_raw
+        else:
+            data = np.memmap(path, dtype=np.int8, mode="r")
+            _sources[path] = lambda start, count: data[2 * start:2 * (start + count)]
+    return _sources[path]
+
+
+def _frame_block(path, first_sample, f0, f1, total_frames, fft_size, window, rows, cols, batch):
+    # Worker task: frames [f0, f1) -> (power sum, max, first waterfall row,
+    # per-row power sums, per-row frame counts)
+    from scipy import fft
+
+    read_raw = _open_source(path)
+    w, _ = _window(window, fft_size)
+    hop = fft_size // 2
+    power_sum = np.zeros(fft_size, dtype=np.float64)
+    power_max = np.zeros(fft_size, dtype=np.float32)
+
+    row_of = (np.arange(f0, f1, dtype=np.int64) * rows) // total_frames
+    row_lo = int(row_of[0])
+    row_sum = np.zeros((int(row_of[-1]) - row_lo + 1, cols), dtype=np.float64)
+    row_count = np.bincount(row_of - row_lo, minlength=len(row_sum))
+
+    for b0 in range(f0, f1, batch):
+        b1 = min(b0 + batch, f1)
+        n = b1 - b0
+        raw = read_raw(first_sample + b0 * hop, (n - 1) * hop + fft_size)
+        x = np.empty(len(raw) // 2, dtype=np.complex64)
+        x.real = raw[0::2]
+        x.imag = raw[1::2]
+        frames = np.lib.stride_tricks.sliding_window_view(x, fft_size)[::hop] * w
+        power = np.abs(fft.fft(frames, axis=1, overwrite_x=True))
+        power *= power
+        power_sum += power.sum(axis=0)
+        np.maximum(power_max, power.max(axis=0), out=power_max)
+        binned = power.reshape(n, cols, fft_size // cols).mean(axis=2)
+        np.add.at(row_sum, row_of[b0 - f0:b1 - f0] - row_lo, binned)
+
+    return power_sum, power_max, row_lo, row_sum, row_count
+
+
+def _describe_input(input_file, sample_rate, center_freq):
+    # (source path for workers, total samples, sample rate, center freq, start time)
+    name = os.path.splitext(input_file)[0]
+    if input_file.endswith(".sigmf-meta") or os.path.exists(name + ".sigmf-meta"):
+        from iq_container import Recording
+        recording = Recording(name)
+        if len(recording.captures) > 1:
+            print(f"Note: {len(recording.captures)} captures (retunes); frequencies are relative to the first")
+        freq = recording.captures[0].get("core:frequency", center_freq)
+        return name + ".sigmf-meta", recording.num_samples, recording.sample_rate, freq, recording.start_time
+    return input_file, os.path.getsize(input_file) // 2, sample_rate, center_freq, None
+
+
+def summarize(input_file=INPUT_FILE, sample_rate=SAMPLE_RATE, center_freq=CENTER_FREQ,
+              start_time=0.0, duration=None, fft_size=FFT_SIZE, window=WINDOW,
+              rows=WATERFALL_ROWS, cols=WATERFALL_COLS, block_frames=BLOCK_FRAMES,
+              batch_frames=BATCH_FRAMES, workers=WORKERS):
+    path, num_samples, sample_rate, center_freq, rec_start = _describe_input(input_file, sample_rate, center_freq)
+    cols = min(cols, fft_size)
+    if fft_size % cols:
+        raise ValueError("WATERFALL_COLS must divide FFT_SIZE")
+
+    hop = fft_size // 2
+    first_sample = min(int(round(start_time * sample_rate)), num_samples)
+    available = num_samples - first_sample
+    if duration is not None:
+        available = min(available, int(round(duration * sample_rate)))
+    total_frames = (available - fft_size) // hop + 1 if available >= fft_size else 0
+    if total_frames == 0:
+        raise ValueError("Recording is shorter than one FFT frame")
+    rows = min(rows, total_frames)
+
+    print(f"Summarizing {total_frames * hop / sample_rate:.2f} s ({total_frames} frames of {fft_size}) "
+          f"with {workers} worker(s)")
+
+    power_sum = np.zeros(fft_size, dtype=np.float64)
+    power_max = np.zeros(fft_size, dtype=np.float32)
+    row_sum = np.zeros((rows, cols), dtype=np.float64)
+    row_count = np.zeros(rows, dtype=np.int64)
+
+    def merge(result):
+        s, m, lo, rs, rc = result
+        power_sum[:] += s
+        np.maximum(power_max, m, out=power_max)
+        row_sum[lo:lo + len(rs)] += rs
+        row_count[lo:lo + len(rc)] += rc
+
+    tasks = [(path, first_sample, f0, min(f0 + block_frames, total_frames), total_frames,
+              fft_size, window, rows, cols, batch_frames)
+             for f0 in range(0, total_frames, block_frames)]
+
+    t0 = time.perf_counter()
+    if workers <= 1:
+        for task in tasks:
+            merge(_frame_block(*task))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        # At most two tasks in flight per worker keeps memory bounded
+        with ProcessPoolExecutor(workers) as pool:
+            pending = deque()
+            for task in tasks:
+                pending.append(pool.submit(_frame_block, *task))
+                if len(pending) >= 2 * workers:
+                    merge(pending.popleft().result())
+            while pending:
+                merge(pending.popleft().result())
+    elapsed = time.perf_counter() - t0
+    processed = (total_frames - 1) * hop + fft_size
+    print(f"Processed {processed / 1e6:.1f} M samples in {elapsed:.2f} s ({processed / elapsed / 1e6:.1f} Msps)")
+
+    # Welch density scaling: |X|^2 / (fs * sum(w^2)), averaged over frames,
+    # with samples normalized to [-1, 1] like record_samples.py (0 dBFS = full scale)
+    _, w_power = _window(window, fft_size)
+    scale = 1.0 / (128.0 ** 2 * sample_rate * w_power)
+    psd = np.fft.fftshift(power_sum / total_frames * scale)
+    maxhold = np.fft.fftshift(power_max * scale)
+    waterfall = row_sum / np.maximum(row_count, 1)[:, None] * scale
+    waterfall = np.fft.fftshift(waterfall, axes=1)
+    freqs = center_freq + np.fft.fftshift(np.fft.fftfreq(fft_size, 1 / sample_rate))
+    # Row r covers frames [r * F / R, (r + 1) * F / R); report its midpoint
+    row_edges = (np.arange(rows + 1) * total_frames + rows - 1) // rows
+    row_times = start_time + ((row_edges[:-1] + row_edges[1:]) / 2 * hop + fft_size / 2) / sample_rate
+
+    return {
+        "freqs": freqs,
+        "psd_db": (10 * np.log10(psd + 1e-20)).astype(np.float32),
+        "maxhold_db": (10 * np.log10(maxhold + 1e-20)).astype(np.float32),
+        "waterfall_db": (10 * np.log10(waterfall + 1e-20)).astype(np.float16),
+        "waterfall_freqs": freqs.reshape(cols, fft_size // cols).mean(axis=1),
+        "row_times": row_times,
+        "sample_rate": sample_rate,
+        "center_freq": center_freq,
+        "fft_size": fft_size,
+        "frames": total_frames,
+        "start_time": start_time,
+        "duration": processed / sample_rate,
+        "recording_start": rec_start if rec_start is not None else np.nan,
+    }
+
+
+def save(summary, output_prefix=OUTPUT_PREFIX):
+    np.savez_compressed(output_prefix + ".npz", **summary)
+    print(f"Saved spectrum summary to {output_prefix}.npz")
+
+
+def plot(summary, output_prefix=OUTPUT_PREFIX):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    freqs_mhz = summary["freqs"] / 1e6
+    fig, (ax_psd, ax_wf) = plt.subplots(2, 1, figsize=(12, 9), height_ratios=[1, 2], sharex=True)
+    ax_psd.plot(freqs_mhz, summary["maxhold_db"], lw=0.6, color="tab:red", label="max hold")
+    ax_psd.plot(freqs_mhz, summary["psd_db"], lw=0.8, color="tab:blue", label="Welch average")
+    ax_psd.set_ylabel("PSD (dBFS/Hz)")
+    ax_psd.set_title(f"{summary['duration']:.1f} s, {summary['frames']} x {summary['fft_size']}-point frames")
+    ax_psd.legend(loc="upper right")
+    ax_psd.grid(True)
+
+    wf = summary["waterfall_db"].astype(np.float32)
+    lo, hi = np.percentile(wf, [5, 99.9])
+    times = summary["row_times"]
+    ax_wf.imshow(wf, aspect="auto", origin="upper", cmap="viridis", vmin=lo, vmax=hi,
+                 extent=[freqs_mhz[0], freqs_mhz[-1], times[-1], times[0]], interpolation="nearest")
+    ax_wf.set_xlabel("Frequency (MHz)")
+    ax_wf.set_ylabel("Time (s)")
+    fig.tight_layout()
+    fig.savefig(output_prefix + ".png", dpi=100)
+    plt.close(fig)
+    print(f"Saved spectrum plot to {output_prefix}.png")
+
+
+def main():
+    parser = ArgumentParser(description="Averaged PSD, max hold and waterfall over a whole cs8 recording")
+    parser.add_argument("input", nargs="?", default=INPUT_FILE, help="bare .bin or indexed recording")
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE, help="sample rate of a bare .bin")
+    parser.add_argument("--freq", type=float, default=CENTER_FREQ, help="center frequency of a bare .bin")
+    parser.add_argument("--start", type=float, default=0.0, help="seconds into the recording")
+    parser.add_argument("--duration", type=float, help="seconds to summarize (default: to the end)")
+    parser.add_argument("--fft-size", type=int, default=FFT_SIZE)
+    parser.add_argument("--rows", type=int, default=WATERFALL_ROWS, help="waterfall height in pixels")
+    parser.add_argument("--cols", type=int, default=WATERFALL_COLS, help="waterfall width in pixels")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--output", default=OUTPUT_PREFIX, help="output prefix for .npz and .png")
+    parser.add_argument("--no-plot", dest="plot", action="store_false")
+    args = parser.parse_args()
+
+    summary = summarize(args.input, args.rate, args.freq, args.start, args.duration, args.fft_size,
+                        rows=args.rows, cols=args.cols, workers=args.workers)
+    save(summary, args.output)
+    if args.plot:
+        plot(summary, args.output)
+
+
+if __name__ == "__main__":
+    main()
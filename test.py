@@ -1,7 +1,6 @@
 import numpy as np
-from scipy.signal import firwin, lfilter, resample_poly
-import matplotlib.pyplot as plt
-from scipy.io import wavfile
+import os
+from profiling import stage
 
 # Parameters
 sample_rate = 20e6          # Initial sample rate
@@ -23,101 +22,182 @@ decimation_factor = 2
 # Desired audio sample rate for WAV
 audio_sample_rate = 48000
 
-# Load raw int8 IQ data (interleaved I,Q)
-raw_bytes = np.fromfile(input_filename, dtype=np.int8)
-iq_samples = (raw_bytes[0::2].astype(np.float32) + 1j * raw_bytes[1::2].astype(np.float32)) / 128.0
+# Optional: seek into an indexed recording (iq_container.py) instead of
+# loading the whole bare .bin, e.g. start_time = 42.5 or retune_freq = 198e6
+start_time = None           # seconds into the recording
+duration = None             # seconds to load (None = to the end)
+retune_freq = None          # load the first segment tuned to this frequency
+
+n_fft = 8192
+
+
+def load_iq(input_filename=input_filename, start_time=start_time, duration=duration, retune_freq=retune_freq,
+            rate=None):
+    # Returns (iq_samples, rate).  An indexed recording's own sample rate wins
+    # over `rate`; a bare .bin has no metadata and uses `rate` (or sample_rate)
+    recording_name = os.path.splitext(input_filename)[0]
+    with stage("load") as s:
+        if os.path.exists(recording_name + ".sigmf-meta"):
+            from iq_container import Recording
+            recording = Recording(recording_name)
+            if rate is not None and rate != recording.sample_rate:
+                print(f"Warning: {recording_name} was recorded at {recording.sample_rate/1e6} MHz, "
+                      f"not {rate/1e6} MHz; using the recording's rate")
+            rate = recording.sample_rate
+            if retune_freq is not None:
+                start, end, _ = recording.segment_at_freq(retune_freq)
+                iq_samples = recording.read(start, end - start)
+            else:
+                iq_samples = recording.read_seconds(start_time or 0.0, duration)
+        else:
+            if rate is None:
+                rate = sample_rate
+            # Load raw int8 IQ data (interleaved I,Q)
+            raw_bytes = np.fromfile(input_filename, dtype=np.int8)
+            iq_samples = (raw_bytes[0::2].astype(np.float32) + 1j * raw_bytes[1::2].astype(np.float32)) / 128.0
+        s.samples = len(iq_samples)
+        s.arrays(iq_samples)
+
+    print(f"Loaded {len(iq_samples)} IQ samples at {rate/1e6} MHz")
+    return iq_samples, rate
 
-print(f"Loaded {len(iq_samples)} IQ samples")
 
 # --- Step 1: Filter main 6 MHz band (low-pass filter) ---
-num_taps = 101
-nyq_rate = sample_rate / 2
-fir_coeff = firwin(num_taps, filter_cutoff / nyq_rate)
+def filter_channel(iq_samples, sample_rate=sample_rate, filter_cutoff=filter_cutoff,
+                   decimation_factor=decimation_factor, output_filename=output_filename):
+    from scipy.signal import firwin, lfilter
+
+    num_taps = 101
+    nyq_rate = sample_rate / 2
+    fir_coeff = firwin(num_taps, filter_cutoff / nyq_rate)
+
+    with stage("channel filter", len(iq_samples)) as s:
+        filtered_i = lfilter(fir_coeff, 1.0, iq_samples.real)
+        filtered_q = lfilter(fir_coeff, 1.0, iq_samples.imag)
+        filtered_samples = filtered_i + 1j * filtered_q
+        s.arrays(filtered_i, filtered_q, filtered_samples)
 
-filtered_i = lfilter(fir_coeff, 1.0, iq_samples.real)
-filtered_q = lfilter(fir_coeff, 1.0, iq_samples.imag)
-filtered_samples = filtered_i + 1j * filtered_q
+    # Decimate to reduce sample rate and data size
+    with stage("decimate", len(filtered_samples)) as s:
+        filtered_samples = filtered_samples[::decimation_factor]
+        s.arrays(filtered_samples)
+    new_sample_rate = sample_rate / decimation_factor
 
-# Decimate to reduce sample rate and data size
-filtered_samples = filtered_samples[::decimation_factor]
-new_sample_rate = sample_rate / decimation_factor
+    print(f"Filtered and decimated to {len(filtered_samples)} samples at {new_sample_rate/1e6} MHz sample rate")
 
-print(f"Filtered and decimated to {len(filtered_samples)} samples at {new_sample_rate/1e6} MHz sample rate")
+    # Save filtered IQ for demodulation later
+    with stage("write", len(filtered_samples)):
+        filtered_samples.astype(np.complex64).tofile(output_filename)
+    print(f"Saved filtered IQ samples to {output_filename}")
+    return filtered_samples, new_sample_rate
 
-# Save filtered IQ for demodulation later
-filtered_samples.astype(np.complex64).tofile(output_filename)
-print(f"Saved filtered IQ samples to {output_filename}")
 
 # --- Step 2: Extract pilot tone ---
+def extract_pilot(filtered_samples, new_sample_rate, pilot_freq=pilot_freq, pilot_bandwidth=pilot_bandwidth,
+                  pilot_filename=pilot_filename):
+    from scipy.signal import firwin, lfilter
 
-num_samples = len(filtered_samples)
-time_vec = np.arange(num_samples) / new_sample_rate
-freq_shift = np.exp(-1j * 2 * np.pi * pilot_freq * time_vec)  # shift pilot tone to baseband
+    num_samples = len(filtered_samples)
+    with stage("mix", num_samples) as s:
+        time_vec = np.arange(num_samples) / new_sample_rate
+        freq_shift = np.exp(-1j * 2 * np.pi * pilot_freq * time_vec)  # shift pilot tone to baseband
 
-shifted_signal = filtered_samples * freq_shift
+        shifted_signal = filtered_samples * freq_shift
+        s.arrays(time_vec, freq_shift, shifted_signal)
 
-# Narrow low-pass filter to isolate pilot tone
-pilot_num_taps = 255
-pilot_bw = pilot_bandwidth
-pilot_fir_coeff = firwin(pilot_num_taps, pilot_bw / (new_sample_rate / 2))
+    # Narrow low-pass filter to isolate pilot tone
+    pilot_num_taps = 255
+    pilot_bw = pilot_bandwidth
+    pilot_fir_coeff = firwin(pilot_num_taps, pilot_bw / (new_sample_rate / 2))
 
-pilot_i = lfilter(pilot_fir_coeff, 1.0, shifted_signal.real)
-pilot_q = lfilter(pilot_fir_coeff, 1.0, shifted_signal.imag)
-pilot_tone = pilot_i + 1j * pilot_q
+    with stage("pilot filter", num_samples) as s:
+        pilot_i = lfilter(pilot_fir_coeff, 1.0, shifted_signal.real)
+        pilot_q = lfilter(pilot_fir_coeff, 1.0, shifted_signal.imag)
+        pilot_tone = pilot_i + 1j * pilot_q
+        s.arrays(pilot_i, pilot_q, pilot_tone)
+
+    # Save pilot IQ to file (optional)
+    with stage("write", num_samples):
+        pilot_tone.astype(np.complex64).tofile(pilot_filename)
+    print(f"Saved pilot tone IQ samples to {pilot_filename}")
+    return pilot_tone
 
-# Save pilot IQ to file (optional)
-pilot_tone.astype(np.complex64).tofile(pilot_filename)
-print(f"Saved pilot tone IQ samples to {pilot_filename}")
 
 # --- Step 3: Convert pilot tone to audio waveform ---
+def pilot_to_wav(pilot_tone, new_sample_rate, audio_sample_rate=audio_sample_rate,
+                 pilot_wav_filename=pilot_wav_filename):
+    from scipy.signal import resample_poly
+    from scipy.io import wavfile
 
-# Take real part as audio signal
-audio_signal = pilot_tone.real
+    # Take real part as audio signal
+    audio_signal = pilot_tone.real
 
-# Normalize audio to -1..1
-audio_signal /= np.max(np.abs(audio_signal))
+    # Normalize audio to -1..1
+    audio_signal /= np.max(np.abs(audio_signal))
 
-# Resample from new_sample_rate (~10 MHz) to audio_sample_rate (48 kHz)
-# Use polyphase resampling for good quality
-audio_resampled = resample_poly(audio_signal, up=audio_sample_rate, down=int(new_sample_rate))
+    # Resample from new_sample_rate (~10 MHz) to audio_sample_rate (48 kHz)
+    # Use polyphase resampling for good quality
+    with stage("resample", len(audio_signal)) as s:
+        audio_resampled = resample_poly(audio_signal, up=audio_sample_rate, down=int(new_sample_rate))
+        s.arrays(audio_resampled)
 
-# Scale to int16 range for WAV
-audio_int16 = np.int16(audio_resampled * 32767)
+    # Scale to int16 range for WAV
+    audio_int16 = np.int16(audio_resampled * 32767)
 
-# Write to WAV file
-wavfile.write(pilot_wav_filename, audio_sample_rate, audio_int16)
-print(f"Saved pilot tone audio to {pilot_wav_filename}")
+    # Write to WAV file
+    with stage("write", len(audio_int16)):
+        wavfile.write(pilot_wav_filename, audio_sample_rate, audio_int16)
+    print(f"Saved pilot tone audio to {pilot_wav_filename}")
 
-# --- Step 4: Plot frequency spectrum of filtered signal ---
 
-import matplotlib.pyplot as plt
-n_fft = 8192
-fft_data = np.fft.fftshift(np.fft.fft(filtered_samples[:n_fft]))
-freq_axis = np.fft.fftshift(np.fft.fftfreq(n_fft, d=1/new_sample_rate))
-magnitude_db = 20 * np.log10(np.abs(fft_data) + 1e-12)
-
-plt.figure(figsize=(10, 6))
-plt.plot(freq_axis / 1e6, magnitude_db)
-plt.title("Frequency Spectrum of Filtered & Decimated IQ Samples")
-plt.xlabel("Frequency (MHz)")
-plt.ylabel("Magnitude (dB)")
-plt.grid(True)
-plt.tight_layout()
-plt.savefig(spectrum_filename)
-print(f"Saved frequency spectrum plot to {spectrum_filename}")
+# --- Step 4: Plot frequency spectrum of filtered signal ---
+def plot_spectrum(filtered_samples, new_sample_rate, spectrum_filename=spectrum_filename):
+    with stage("plot"):
+        import matplotlib.pyplot as plt
 
-# --- Step 5: Plot frequency spectrum of pilot tone ---
+        fft_data = np.fft.fftshift(np.fft.fft(filtered_samples[:n_fft]))
+        freq_axis = np.fft.fftshift(np.fft.fftfreq(n_fft, d=1/new_sample_rate))
+        magnitude_db = 20 * np.log10(np.abs(fft_data) + 1e-12)
 
-fft_pilot = np.fft.fftshift(np.fft.fft(pilot_tone[:n_fft]))
-magnitude_pilot_db = 20 * np.log10(np.abs(fft_pilot) + 1e-12)
+        plt.figure(figsize=(10, 6))
+        plt.plot(freq_axis / 1e6, magnitude_db)
+        plt.title("Frequency Spectrum of Filtered & Decimated IQ Samples")
+        plt.xlabel("Frequency (MHz)")
+        plt.ylabel("Magnitude (dB)")
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(spectrum_filename)
+        print(f"Saved frequency spectrum plot to {spectrum_filename}")
 
-plt.figure(figsize=(10, 6))
-plt.plot(np.fft.fftshift(np.fft.fftfreq(n_fft, d=1/new_sample_rate))/1e3, magnitude_pilot_db)
-plt.title("Frequency Spectrum of Extracted Pilot Tone")
-plt.xlabel("Frequency (kHz)")
-plt.ylabel("Magnitude (dB)")
-plt.grid(True)
-plt.tight_layout()
-plt.savefig(pilot_spectrum_filename)
-print(f"Saved pilot tone spectrum plot to {pilot_spectrum_filename}")
 
+# --- Step 5: Plot frequency spectrum of pilot tone ---
+def plot_pilot_spectrum(pilot_tone, new_sample_rate, pilot_spectrum_filename=pilot_spectrum_filename):
+    with stage("plot"):
+        import matplotlib.pyplot as plt
+
+        fft_pilot = np.fft.fftshift(np.fft.fft(pilot_tone[:n_fft]))
+        magnitude_pilot_db = 20 * np.log10(np.abs(fft_pilot) + 1e-12)
+
+        plt.figure(figsize=(10, 6))
+        plt.plot(np.fft.fftshift(np.fft.fftfreq(n_fft, d=1/new_sample_rate))/1e3, magnitude_pilot_db)
+        plt.title("Frequency Spectrum of Extracted Pilot Tone")
+        plt.xlabel("Frequency (kHz)")
+        plt.ylabel("Magnitude (dB)")
+        plt.grid(True)
+        plt.tight_layout()
+        plt.savefig(pilot_spectrum_filename)
+        print(f"Saved pilot tone spectrum plot to {pilot_spectrum_filename}")
+
+
+def analyze(input_filename=input_filename, plots=True, **load_args):
+    iq_samples, rate = load_iq(input_filename, **load_args)
+    filtered_samples, new_sample_rate = filter_channel(iq_samples, rate)
+    pilot_tone = extract_pilot(filtered_samples, new_sample_rate)
+    pilot_to_wav(pilot_tone, new_sample_rate)
+    if plots:
+        plot_spectrum(filtered_samples, new_sample_rate)
+        plot_pilot_spectrum(pilot_tone, new_sample_rate)
+
+
+if __name__ == "__main__":
+    analyze()
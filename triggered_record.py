@@ -0,0 +1,239 @@
+import numpy as np
+from argparse import ArgumentParser
+from collections import deque
+import datetime
+import json
+
+# Triggered/squelched IQ recorder.
+#
+# Same cs8 output as record_samples.py, but only the segments where a cheap
+# per-block metric crosses a threshold are written.  A ring buffer keeps
+# PRE_ROLL seconds of history so a segment starts before the trigger, and
+# recording continues for POST_ROLL seconds after the metric drops.  Each
+# segment gets its own file and a JSON sidecar with its start time and
+# center frequency.
+#
+# A file only ever holds contiguous samples: when blocks were dropped
+# upstream (AsyncHackRF backpressure, or a gap in the broker's sequence
+# numbers) the open segment is closed and a new one starts after the gap,
+# with the number of lost blocks in its sidecar; the pre-roll is discarded.
+
+# === SETTINGS ===
+CENTER_FREQ = 198e6
+SAMPLE_RATE = 20e6
+THRESHOLD_DB = -30.0            # Trigger level (dBFS for power, dB for pilot SNR)
+HYSTERESIS_DB = 3.0             # Release level = threshold - hysteresis
+PRE_ROLL = 0.5                  # Seconds kept before the trigger
+POST_ROLL = 1.0                 # Seconds kept after the metric drops
+OUTPUT_PREFIX = "triggered"
+
+
+def block_power_db(block):
+    # Mean |x|^2 of an int8 cs8 block in dBFS (a dot product, no complex math)
+    x = np.frombuffer(block, dtype=np.int8).astype(np.float32)
+    return 10 * np.log10(np.dot(x, x) / (len(x) / 2) / 128.0**2 + 1e-20)
+
+
+class PilotMetric:
+    # Pilot SNR from the streaming tracker; holds the last estimate between updates
+
+    def __init__(self, sample_rate, center_freq):
+        from pilot_tracker import PilotTracker
+        from async_hackrf import cs8_to_complex
+        self.cs8_to_complex = cs8_to_complex
+        self.tracker = PilotTracker(sample_rate, center_freq, update_rate=20.0, estimate_file=None)
+        self.value = -np.inf
+
+    def __call__(self, block):
+        for estimate in self.tracker.process(self.cs8_to_complex(block)):
+            self.value = estimate["pilot_snr_db"] if estimate["locked"] else -np.inf
+        return self.value
+
+
+class TriggeredRecorder:
+
+    def __init__(self, sample_rate=SAMPLE_RATE, center_freq=CENTER_FREQ, threshold_db=THRESHOLD_DB,
+                 hysteresis_db=HYSTERESIS_DB, pre_roll=PRE_ROLL, post_roll=POST_ROLL,
+                 output_prefix=OUTPUT_PREFIX, metric=block_power_db):
+        self.sample_rate = sample_rate
+        self.center_freq = center_freq
+        self.threshold_db = threshold_db
+        self.release_db = threshold_db - hysteresis_db
+        self.pre_roll = pre_roll
+        self.post_roll = post_roll
+        self.output_prefix = output_prefix
+        self.metric = metric
+
+        self.history = deque()          # (timestamp, block) pre-trigger ring
+        self.history_samples = 0
+        self.segment = None
+        self.quiet_samples = 0
+        self.segments = []
+        self.bytes_seen = 0
+        self.bytes_written = 0
+        self.gaps = 0
+        self.dropped_blocks = 0
+
+    def _open_segment(self, timestamp, gap_before=0):
+        stamp = datetime.datetime.fromtimestamp(timestamp).strftime("%Y%m%d-%H%M%S.%f")
+        filename = f"{self.output_prefix}_{stamp}_{self.center_freq/1e6:.3f}MHz.bin"
+        self.segment = {
+            "filename": filename,
+            "file": open(filename, "wb"),
+            "start_time": timestamp,
+            "num_samples": 0,
+            "gap_before": gap_before,
+            "gap_after": 0,
+        }
+        print(f"Triggered at {stamp}, recording to {filename}")
+
+    def _write(self, block):
+        self.segment["file"].write(block)
+        self.segment["num_samples"] += len(block) // 2
+        self.bytes_written += len(block)
+
+    def _close_segment(self):
+        seg = self.segment
+        seg["file"].close()
+        meta = {
+            "start_time": seg["start_time"],
+            "start_time_iso": datetime.datetime.fromtimestamp(seg["start_time"]).isoformat(),
+            "center_freq": self.center_freq,
+            "sample_rate": self.sample_rate,
+            "format": "cs8",
+            "num_samples": seg["num_samples"],
+            "duration": seg["num_samples"] / self.sample_rate,
+            "dropped_blocks_before": seg["gap_before"],
+            "dropped_blocks_after": seg["gap_after"],
+        }
+        with open(seg["filename"] + ".json", "w") as f:
+            json.dump(meta, f, indent=2)
+        print(f"Segment closed: {meta['duration']:.2f} s in {seg['filename']}")
+        self.segments.append(meta)
+        self.segment = None
+
+    def process(self, timestamp, block, gap=0):
+        # timestamp is the wall-clock time of the first sample in block; gap
+        # is the number of blocks lost right before it
+        n = len(block) // 2
+        self.bytes_seen += len(block)
+        level = self.metric(block)
+
+        if gap:
+            self.gaps += 1
+            self.dropped_blocks += gap
+            print(f"{gap} blocks dropped before {timestamp:.3f}")
+            self.history.clear()
+            self.history_samples = 0
+            if self.segment is not None:
+                # Split: the samples on either side are not contiguous
+                self.segment["gap_after"] = gap
+                self._close_segment()
+                self._open_segment(timestamp, gap)
+
+        if self.segment is None:
+            if level >= self.threshold_db:
+                # Start the segment at the oldest pre-roll block
+                start = self.history[0][0] if self.history else timestamp
+                self._open_segment(start)
+                for _, old in self.history:
+                    self._write(old)
+                self.history.clear()
+                self.history_samples = 0
+                self._write(block)
+                self.quiet_samples = 0
+            else:
+                self.history.append((timestamp, block))
+                self.history_samples += n
+                while self.history and self.history_samples - len(self.history[0][1]) // 2 >= \
+                        self.pre_roll * self.sample_rate:
+                    self.history_samples -= len(self.history.popleft()[1]) // 2
+            return level
+
+        self._write(block)
+        if level >= self.release_db:
+            self.quiet_samples = 0
+        else:
+            self.quiet_samples += n
+            if self.quiet_samples >= self.post_roll * self.sample_rate:
+                self._close_segment()
+        return level
+
+    def close(self):
+        if self.segment is not None:
+            self._close_segment()
+        duty = self.bytes_written / self.bytes_seen if self.bytes_seen else 0.0
+        print(f"{len(self.segments)} segments, wrote {self.bytes_written / 1e6:.1f} MB of "
+              f"{self.bytes_seen / 1e6:.1f} MB seen ({100 * duty:.1f}% duty cycle), "
+              f"{self.dropped_blocks} blocks dropped in {self.gaps} gaps")
+
+
+def main():
+    parser = ArgumentParser(description="Record IQ only while a signal is present")
+    parser.add_argument("--freq", type=float, default=CENTER_FREQ)
+    parser.add_argument("--rate", type=float, default=SAMPLE_RATE)
+    parser.add_argument("--metric", choices=["power", "pilot"], default="power")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD_DB,
+                        help="dBFS for power, pilot SNR in dB for pilot")
+    parser.add_argument("--hysteresis", type=float, default=HYSTERESIS_DB)
+    parser.add_argument("--pre-roll", type=float, default=PRE_ROLL)
+    parser.add_argument("--post-roll", type=float, default=POST_ROLL)
+    parser.add_argument("--prefix", default=OUTPUT_PREFIX)
+    parser.add_argument("--seconds", type=float, help="stop after this long (default: until Ctrl-C)")
+    parser.add_argument("--broker", nargs="?", const="/tmp/hackrf_iq.sock",
+                        help="subscribe to iq_broker.py instead of opening the HackRF")
+    parser.add_argument("--replay", help="run over a cs8 file instead of live IQ")
+    args = parser.parse_args()
+
+    metric = block_power_db if args.metric == "power" else PilotMetric(args.rate, args.freq)
+    recorder = TriggeredRecorder(args.rate, args.freq, args.threshold, args.hysteresis,
+                                 args.pre_roll, args.post_roll, args.prefix, metric)
+    limit = None if args.seconds is None else int(args.seconds * args.rate) * 2
+
+    try:
+        if args.replay:
+            import time
+            from async_hackrf import BLOCK_SIZE
+            start = time.time()
+            with open(args.replay, "rb") as f:
+                index = 0
+                while True:
+                    block = f.read(2 * BLOCK_SIZE)
+                    if not block or (limit is not None and recorder.bytes_seen >= limit):
+                        break
+                    recorder.process(start + index / args.rate, block)
+                    index += len(block) // 2
+        elif args.broker:
+            from iq_broker import IQSubscriber
+            expected = dropped = None
+            for header, block in IQSubscriber(args.broker, raw=True):
+                # Lost blocks show up as a sequence gap and in the broker's
+                # per-subscriber drop count
+                gap = 0
+                if expected is not None:
+                    gap = max(header["seq"] - expected, header["dropped"] - dropped)
+                expected, dropped = header["seq"] + 1, header["dropped"]
+                recorder.center_freq = header["center_freq"]
+                recorder.process(header["timestamp"], block, gap)
+                if limit is not None and recorder.bytes_seen >= limit:
+                    break
+        else:
+            import asyncio
+            from async_hackrf import AsyncHackRF
+
+            async def run():
+                async with AsyncHackRF(sample_rate=args.rate, center_freq=args.freq) as sdr:
+                    async for block in sdr.rx(raw=True):
+                        # Metric and disk writes run off the event loop
+                        await sdr.run_dsp(recorder.process, sdr.last_timestamp, block, sdr.last_gap)
+                        if limit is not None and recorder.bytes_seen >= limit:
+                            break
+
+            asyncio.run(run())
+    except KeyboardInterrupt:
+        print("Stopping...")
+    recorder.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+import json
+import queue
+import threading
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from ntsc_encode import SAMP_RATE, SAMPLES_PER_LINE
+
+# Deadline-aware field scheduler between an NTSC baseband producer and the
+# HackRF TX sink (osmosdr_sink_0 in ntsc_hackrf.py, ~12.15 Msps).
+#
+# The producer (PNG encoder or .dat reader) runs in its own thread and pushes
+# whole frames; they are split into even/odd fields and queued.  The sink
+# side pulls samples with read(n).  Each time a field is needed, the
+# scheduler works out how far ahead of real time the sink already is (slack)
+# and waits at most that long, minus GUARD, for the producer.  When the
+# producer falls behind it degrades instead of letting the HackRF underrun:
+#
+#   no_chroma  queue below LOW_WATER fields: ask the producer for luma-only
+#              fields (no burst, no subcarrier; cheaper to encode, and .dat
+#              frames get the burst blanked and a 3.58 MHz trap)
+#   repeat     nothing ready by the deadline: resend the last complete field
+#              of the same parity, so vertical sync keeps alternating
+#   black      nothing to repeat yet, or repeated MAX_REPEATS times in a row:
+#              send a pre-encoded black field with correct sync
+#
+# Late fields of the wrong parity are dropped.  Every mode change is printed
+# and logged; report() gives the time spent in each mode.
+#
+# CPU-bound producers (the pure-Python PNG encoder) must run with
+# start_process(): in a thread they hold the GIL and starve read() itself.
+
+# === SETTINGS ===
+FIELD_SAMPLES = SAMPLES_PER_LINE * 525 // 2     # 202650 samples per field
+FRAME_SAMPLES = 2 * FIELD_SAMPLES
+QUEUE_FIELDS = 8                # ~133 ms of video buffered ahead of the sink
+LOW_WATER = 2                   # queued fields at or below this -> drop chroma
+HIGH_WATER = 6                  # queued fields at or above this -> chroma back on
+GUARD = 0.005                   # seconds of slack kept in reserve when waiting
+MAX_REPEATS = 30                # consecutive repeats (0.5 s) before going black
+TX_FREQ = 207e6
+RF_GAIN = 47
+IF_GAIN = 40
+DIGITAL_GAIN = 0.9
+FM_AMPL = 0.11
+AUDIO_RATE = 48000
+
+CHROMA_TRAP_Q = 2.0             # 3.58 MHz notch for pre-encoded fields (~1.8 MHz wide)
+
+MODES = ("normal", "no_chroma", "repeat", "black", "idle")
+
+_black = None
+_burst = None
+
+
+def black_fields():
+    # Pre-encoded black frame (luma only), split into (even, odd) fields
+    global _black
+    if _black is None:
+        from ntsc_encode import genFields
+        frame = np.array(genFields([(0, 0, 0)] * (640 * 480), chroma=False), dtype=np.float32)
+        _black = (frame[:FIELD_SAMPLES], frame[FIELD_SAMPLES:])
+    return _black
+
+
+def burst_mask():
+    # Colour burst samples of a frame: where a chroma and a luma-only black
+    # frame differ (only the burst does)
+    global _burst
+    if _burst is None:
+        from ntsc_encode import genFields
+        frame = np.array(genFields([(0, 0, 0)] * (640 * 480), chroma=True), dtype=np.float32)
+        _burst = frame != np.concatenate(black_fields())
+    return _burst
+
+
+def strip_chroma(frame):
+    # Luma-only version of an already encoded frame: blank the burst, then
+    # trap the 3.58 MHz subcarrier (zero phase, so luma edges stay put)
+    from scipy.signal import iirnotch, filtfilt
+    from ntsc_encode import COLOR_FREQ
+    frame = np.where(burst_mask(), np.concatenate(black_fields()), frame)
+    b, a = iirnotch(COLOR_FREQ, CHROMA_TRAP_Q, fs=SAMP_RATE)
+    return filtfilt(b, a, frame).astype(np.float32)
+
+
+# === PRODUCERS ===
+# Generators yielding (frame samples, chroma) for FieldScheduler.start() /
+# start_process().  chroma() returns the scheduler's current request.
+
+def dat_frames(filename, loop=True, chroma=lambda: True):
+    # Pre-encoded ntsc_encode.py output (float32, whole frames); when chroma
+    # is off the burst and subcarrier are stripped from the stored frame
+    data = np.memmap(filename, dtype=np.float32, mode="r")
+    num_frames = len(data) // FRAME_SAMPLES
+    if num_frames == 0:
+        raise ValueError(f"{filename} is shorter than one frame")
+    while True:
+        for i in range(num_frames):
+            frame = np.array(data[i * FRAME_SAMPLES:(i + 1) * FRAME_SAMPLES])
+            use_chroma = chroma()
+            yield (frame if use_chroma else strip_chroma(frame)), use_chroma
+        if not loop:
+            return
+
+
+def png_frames(input_filename, framecount=1, loop=True, chroma=lambda: True):
+    # Encode PNGs on the fly (same naming as ntsc_encode.py); follows the
+    # scheduler's chroma request frame by frame
+    from PIL import Image
+    from ntsc_encode import genFields
+
+    if framecount <= 1:
+        names = [input_filename]
+    else:
+        names = [input_filename[:-4] + "%03d" % (i + 1,) + input_filename[-4:] for i in range(framecount)]
+    while True:
+        for name in names:
+            use_chroma = chroma()
+            pixels = list(Image.open(name).convert("RGB").getdata())
+            yield np.array(genFields(pixels, use_chroma), dtype=np.float32), use_chroma
+        if not loop:
+            return
+
+
+def _producer_process(factory, args, frames_out, chroma_flag):
+    for item in factory(*args, chroma=lambda: bool(chroma_flag.value)):
+        frames_out.put(item)
+    frames_out.put(None)
+
+
+class FieldScheduler:
+
+    def __init__(self, sample_rate=SAMP_RATE, queue_fields=QUEUE_FIELDS, low_water=LOW_WATER,
+                 high_water=HIGH_WATER, guard=GUARD, max_repeats=MAX_REPEATS, verbose=True):
+        self.sample_rate = sample_rate
+        self.low_water = low_water
+        self.high_water = high_water
+        self.guard = guard
+        self.max_repeats = max_repeats
+        self.verbose = verbose
+        self.fields = queue.Queue(queue_fields)
+        self.chroma = True              # producer hint
+        self.events = []
+        self.mode = None
+        self.mode_fields = dict.fromkeys(MODES, 0)
+        self.late_dropped = 0
+        self.late_reads = 0             # reads that arrived after the deadline (sink already starved)
+        self.producer_done = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._process = None
+        self._chroma_flag = None
+        self._last = [None, None]       # last complete (even, odd) field
+        self._repeats = 0
+        self._parity = 0                # parity of the next field to send
+        self._field = np.zeros(0, dtype=np.float32)
+        self._pos = 0
+        self._emitted = 0
+        self._start = None
+        black_fields()
+
+    # === PRODUCER SIDE ===
+
+    def start(self, frames):
+        self._thread = threading.Thread(target=self._produce, args=(frames,), daemon=True)
+        self._thread.start()
+
+    def start_process(self, factory, *args):
+        # Run factory(*args, chroma=...) in a child process; a relay thread
+        # feeds its frames to the queue without holding the GIL while waiting
+        import multiprocessing
+        self._chroma_flag = multiprocessing.Value("b", 1, lock=False)
+        frames_in = multiprocessing.Queue(2)
+        self._process = multiprocessing.Process(target=_producer_process, daemon=True,
+                                                args=(factory, args, frames_in, self._chroma_flag))
+        self._process.start()
+
+        def relay():
+            while not self._stop.is_set():
+                try:
+                    item = frames_in.get(timeout=0.1)
+                except queue.Empty:
+                    if not self._process.is_alive():
+                        return
+                    continue
+                if item is None:
+                    return
+                yield item
+
+        self.start(relay())
+
+    def wait_ready(self, timeout=2.0):
+        # Pre-roll: let the producer fill the queue before the sink starts
+        deadline = time.perf_counter() + timeout
+        while self.fields.qsize() < self.high_water and not self.producer_done.is_set() \
+                and time.perf_counter() < deadline:
+            time.sleep(0.01)
+
+    def stop(self):
+        self._stop.set()
+        if self._process is not None:
+            self._process.terminate()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _produce(self, frames):
+        try:
+            for frame, chroma in frames:
+                if len(frame) != FRAME_SAMPLES:
+                    raise ValueError(f"frame has {len(frame)} samples, expected {FRAME_SAMPLES}")
+                for parity in (0, 1):
+                    item = (parity, frame[parity * FIELD_SAMPLES:(parity + 1) * FIELD_SAMPLES], chroma)
+                    while not self._stop.is_set():
+                        try:
+                            self.fields.put(item, timeout=0.1)
+                            break
+                        except queue.Full:
+                            pass
+                if self._stop.is_set():
+                    return
+        finally:
+            self.producer_done.set()
+            if not self._stop.is_set():
+                self._log("producer_done")
+
+    # === SINK SIDE ===
+
+    def read(self, n):
+        # Next n baseband samples; never blocks past the real-time deadline
+        if self._start is None:
+            self._start = time.perf_counter()
+        elif self.slack() < 0:
+            self.late_reads += 1
+        out = np.empty(n, dtype=np.float32)
+        filled = 0
+        while filled < n:
+            if self._pos >= len(self._field):
+                self._next_field()
+            take = min(n - filled, len(self._field) - self._pos)
+            out[filled:filled + take] = self._field[self._pos:self._pos + take]
+            self._pos += take
+            filled += take
+        self._emitted += n
+        return out
+
+    def slack(self):
+        # Seconds of signal already handed to the sink beyond real time
+        if self._start is None:
+            return 0.0
+        return self._emitted / self.sample_rate - (time.perf_counter() - self._start)
+
+    def _get(self, parity, timeout):
+        deadline = time.perf_counter() + timeout
+        while True:
+            try:
+                remaining = deadline - time.perf_counter()
+                item = self.fields.get(timeout=remaining) if remaining > 0 else self.fields.get_nowait()
+            except queue.Empty:
+                return None
+            if item[0] == parity:
+                return item
+            # A late field of the wrong parity; sending it would break interlace
+            self.late_dropped += 1
+
+    def _next_field(self):
+        parity = self._parity
+        item = self._get(parity, max(self.slack() - self.guard, 0.0))
+        if item is not None:
+            _, field, chroma = item
+            self._last[parity] = field
+            self._repeats = 0
+            mode = "normal" if chroma else "no_chroma"
+        elif self.producer_done.is_set():
+            field, mode = black_fields()[parity], "idle"
+        elif self._last[parity] is not None and self._repeats < self.max_repeats:
+            field, mode = self._last[parity], "repeat"
+            self._repeats += 1
+        else:
+            field, mode = black_fields()[parity], "black"
+
+        if mode != self.mode:
+            self._log("mode", previous=self.mode, mode=mode)
+            self.mode = mode
+        self.mode_fields[mode] += 1
+        self._field = field
+        self._pos = 0
+        self._parity ^= 1
+        self._update_chroma()
+
+    def _update_chroma(self):
+        depth = self.fields.qsize()
+        if self.chroma and depth <= self.low_water and not self.producer_done.is_set():
+            self._set_chroma(False)
+        elif not self.chroma and depth >= self.high_water:
+            self._set_chroma(True)
+
+    def _set_chroma(self, chroma):
+        self.chroma = chroma
+        if self._chroma_flag is not None:
+            self._chroma_flag.value = int(chroma)
+        self._log("chroma_on" if chroma else "chroma_off")
+
+    def _log(self, event, **fields):
+        entry = {"time": time.perf_counter() - self._start if self._start else 0.0, "event": event,
+                 "queue_fields": self.fields.qsize(), "slack_ms": self.slack() * 1e3, **fields}
+        self.events.append(entry)
+        if self.verbose:
+            detail = f"{fields.get('previous')} -> {fields['mode']}" if event == "mode" else event
+            print(f"[{entry['time']:8.3f} s] {detail} (queue {entry['queue_fields']} fields, "
+                  f"slack {entry['slack_ms']:.1f} ms)", flush=True)
+
+    # === REPORTING ===
+
+    def mode_seconds(self):
+        return {mode: count * FIELD_SAMPLES / self.sample_rate for mode, count in self.mode_fields.items()}
+
+    def report(self):
+        seconds = self.mode_seconds()
+        total = sum(seconds.values()) or 1.0
+        print(f"{'mode':<10} {'seconds':>9} {'share':>7}")
+        for mode in MODES:
+            print(f"{mode:<10} {seconds[mode]:9.2f} {100 * seconds[mode] / total:6.1f}%")
+        changes = sum(1 for e in self.events if e["event"] == "mode")
+        print(f"{changes} mode changes, {self.late_dropped} late fields dropped, "
+              f"{self.late_reads} late sink reads")
+
+    def save_report(self, filename):
+        with open(filename, "w") as f:
+            json.dump({"mode_seconds": self.mode_seconds(), "mode_fields": self.mode_fields,
+                       "late_fields_dropped": self.late_dropped,
+                       "late_reads": self.late_reads, "events": self.events}, f, indent=2)
+
+
+# === TX ===
+
+def gr_source(scheduler):
+    # GNU Radio float source that pulls from the scheduler; replaces the
+    # blocks_file_source_0 of ntsc_hackrf.py
+    from gnuradio import gr
+
+    class FieldSource(gr.sync_block):
+
+        def __init__(self):
+            gr.sync_block.__init__(self, name="ntsc_field_scheduler", in_sig=None, out_sig=[np.float32])
+
+        def work(self, input_items, output_items):
+            out = output_items[0]
+            out[:] = scheduler.read(len(out))
+            return len(out)
+
+    return FieldSource()
+
+
+def transmit(scheduler, tx_freq=TX_FREQ, rf_gain=RF_GAIN, if_gain=IF_GAIN, audio_file=None):
+    # Headless version of the ntsc_hackrf.py flowgraph with the scheduler as
+    # the video source
+    from gnuradio import gr, analog, blocks, filter
+    from gnuradio.filter import firdes
+    from gnuradio.fft import window
+    import osmosdr
+
+    tb = gr.top_block("ntsc_scheduled_tx")
+    source = gr_source(scheduler)
+    gain = blocks.multiply_const_ff(DIGITAL_GAIN)
+    to_complex = blocks.float_to_complex(1)
+    zero = analog.sig_source_f(0, analog.GR_CONST_WAVE, 0, 0, 0)
+    vsb = filter.fir_filter_ccc(1, firdes.complex_band_pass(1, SAMP_RATE, (-2475000 + 1725000), 4e6, 500000,
+                                                             window.WIN_HAMMING, 6.76))
+    add = blocks.add_vcc(1)
+    sink = osmosdr.sink(args="numchan=1 hackrf=0")
+    sink.set_sample_rate(SAMP_RATE)
+    sink.set_center_freq(tx_freq, 0)
+    sink.set_gain(rf_gain, 0)
+    sink.set_if_gain(if_gain, 0)
+    sink.set_bb_gain(0, 0)
+
+    tb.connect(source, gain, to_complex, vsb, (add, 1))
+    tb.connect(zero, (to_complex, 1))
+    if audio_file:
+        wav = blocks.wavfile_source(audio_file, True)
+        fm = analog.wfm_tx(audio_rate=AUDIO_RATE, quad_rate=10 * AUDIO_RATE, tau=75e-6, max_dev=25e3, fh=-1.0)
+        resampler = filter.rational_resampler_ccc(interpolation=int(12.15e6), decimation=10 * AUDIO_RATE,
+                                                  taps=[], fractional_bw=0)
+        shift = filter.freq_xlating_fir_filter_ccc(1, [1], -4.5e6, 12.15e6)
+        tb.connect(wav, fm, resampler, shift, blocks.multiply_const_cc(FM_AMPL), (add, 0))
+    else:
+        tb.connect(analog.sig_source_c(0, analog.GR_CONST_WAVE, 0, 0, 0), (add, 0))
+    tb.connect(add, sink)
+
+    print(f"Transmitting NTSC @ {tx_freq / 1e6:.2f} MHz, Ctrl+C to stop")
+    tb.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    tb.stop()
+    tb.wait()
+
+
+def simulate(scheduler, seconds, chunk=131072, buffers=4):
+    # Consume at the sink rate without hardware, to check a producer against
+    # the deadline.  Like the HackRF sink, keeps `buffers` transfers of
+    # `chunk` samples queued ahead of real time.
+    ahead = buffers * chunk / scheduler.sample_rate
+    consumed = 0
+    while consumed < seconds * scheduler.sample_rate:
+        if scheduler.slack() < ahead:
+            scheduler.read(chunk)
+            consumed += chunk
+        else:
+            time.sleep(chunk / scheduler.sample_rate / 4)
+
+
+def main():
+    parser = ArgumentParser(description="Transmit NTSC with a real-time deadline watchdog")
+    parser.add_argument("input", help="ntsc_encode.py .dat output, or a PNG (first of a sequence)")
+    parser.add_argument("--frames", type=int, default=1, help="PNG sequence length")
+    parser.add_argument("--once", action="store_true", help="do not loop the input")
+    parser.add_argument("--freq", type=float, default=TX_FREQ)
+    parser.add_argument("--rf-gain", type=int, default=RF_GAIN)
+    parser.add_argument("--if-gain", type=int, default=IF_GAIN)
+    parser.add_argument("--audio", help="WAV to send as the FM sound carrier")
+    parser.add_argument("--simulate", type=float, help="no HackRF: consume this many seconds at the sink rate")
+    parser.add_argument("--report", help="save mode times and degradation events as JSON")
+    args = parser.parse_args()
+
+    scheduler = FieldScheduler()
+    if args.input.lower().endswith(".png"):
+        scheduler.start_process(png_frames, args.input, args.frames, not args.once)
+    else:
+        scheduler.start(dat_frames(args.input, loop=not args.once, chroma=lambda: scheduler.chroma))
+
+    scheduler.wait_ready()
+    try:
+        if args.simulate:
+            simulate(scheduler, args.simulate)
+        else:
+            transmit(scheduler, args.freq, args.rf_gain, args.if_gain, args.audio)
+    finally:
+        scheduler.stop()
+        print()
+        scheduler.report()
+        if args.report:
+            scheduler.save_report(args.report)
+            print(f"Saved scheduler report to {args.report}")
+
+
+if __name__ == "__main__":
+    main()